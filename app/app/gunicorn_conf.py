@@ -0,0 +1,100 @@
+"""Gunicorn configuration, used with ``gunicorn -c python:app.gunicorn_conf``
+
+Every setting can be overridden through the environment, see the
+``GUNICORN_*`` variables below.
+"""
+import os
+
+
+def cpu_count():
+    """CPUs this process may run on, which respects container cpusets"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Sync workers, the classic 2 * CPUs + 1 of them. `manage.py benchmark gunicorn`
+# measured them level with 2 threads per worker on throughput (490-600 vs
+# 450-660 req/s over four runs) and ahead on tail latency (p95 about 45 vs
+# 70 ms), so threads are opt-in through GUNICORN_THREADS
+workers = int(os.environ.get("GUNICORN_WORKERS", 2 * cpu_count() + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# Import Django, DRF and the apps once in the master, workers share the memory
+preload_app = bool(int(os.environ.get("GUNICORN_PRELOAD", 1)))
+
+# Restart workers now and then to contain memory growth, with jitter so
+# they don't all restart at the same time
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Docker's /tmp may be on a slow overlay, heartbeat files belong in memory
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+    # Throttle counters and replica pins shared by the workers
+    os.environ.setdefault("SHARED_CACHE_LOCATION", "/dev/shm/recipe-api-shared")
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG")
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+
+
+# See core.concurrency
+_limit_in_flight = bool(int(os.environ.get("MAX_IN_FLIGHT_REQUESTS", 0)))
+
+
+def when_ready(server):
+    """Prime caches in the master, they are inherited by every worker"""
+    if server.cfg.preload_app:
+        from django.db import connections
+
+        from core.warmup import warmup
+
+        server.log.info(warmup(connect=False))
+        # Connections must not be shared across forked workers
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    """Warm up a forked worker once it has loaded the application"""
+    from core.warmup import warmup
+
+    worker.log.info(warmup())
+
+
+def pre_fork(server, worker):
+    """Give the new worker a slot in the shared in-flight request counters"""
+    if _limit_in_flight:
+        from core import concurrency
+
+        worker.concurrency_slot = concurrency.assign_slot()
+
+
+def post_fork(server, worker):
+    if _limit_in_flight:
+        from core import concurrency
+
+        concurrency.use_slot(worker.concurrency_slot)
+
+
+def child_exit(server, worker):
+    """Release the in-flight requests of a worker that died serving them"""
+    if _limit_in_flight:
+        from core import concurrency
+
+        concurrency.release_slot(worker.concurrency_slot)
+
+
+def worker_exit(server, worker):
+    """Log what happened to the connections of the exiting worker"""
+    from core.backends.postgresql.base import connection_metrics
+
+    server.log.info("Worker %s connection metrics: %s", worker.pid, connection_metrics())
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_swagger",
     "rest_framework.authtoken",
@@ -44,15 +45,39 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.ConcurrencyLimitMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "core.middleware.CompressionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "core.middleware.BrowserMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.ReplicaRoutingMiddleware",
+]
+
+# Middleware only the browser facing pages (admin, docs) need. It is run by
+# core.middleware.BrowserMiddleware for every path except API_PATH_PREFIXES,
+# whose views all use token authentication
+BROWSER_MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# API-only workers leave out the admin, the swagger docs and the session,
+# message and session based auth machinery only browsers use, so they boot
+# faster and run less middleware per request
+API_ONLY = bool(int(os.environ.get("API_ONLY", 0)))
+if API_ONLY:
+    BROWSER_APPS = (
+        "django.contrib.admin",
+        "django.contrib.sessions",
+        "django.contrib.messages",
+        "rest_framework_swagger",
+    )
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in BROWSER_APPS]
+    MIDDLEWARE.remove("core.middleware.BrowserMiddleware")
+
 ROOT_URLCONF = "app.urls"
 
 TEMPLATES = [
@@ -71,6 +96,11 @@ TEMPLATES = [
     },
 ]
 
+if API_ONLY:
+    TEMPLATES[0]["OPTIONS"]["context_processors"].remove(
+        "django.contrib.messages.context_processors.messages"
+    )
+
 WSGI_APPLICATION = "app.wsgi.application"
 
 
@@ -81,20 +111,53 @@ DATABASES = {
     "default": {
         # 'ENGINE': 'django.db.backends.sqlite3',
         # 'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "core.backends.postgresql",
         "HOST": os.environ.get("DB_HOST"),
         "NAME": os.environ.get("DB_NAME"),
         "USER": os.environ.get("DB_USER"),
         "PASSWORD": os.environ.get("DB_PASS"),
         "PORT": os.environ.get("DB_PORT"),
+        # Keep connections open between requests, see core.backends.postgresql.
+        # With DB_POOL_SIZE set, use DB_CONN_MAX_AGE=0 so connections go back
+        # to the pool at the end of every request.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("DB_CONN_HEALTH_CHECKS", 1))),
+        "POOL_SIZE": int(os.environ.get("DB_POOL_SIZE", 0)),
         "TEST": {"NAME": "test_db"},
     }
 }
 
+# Read replicas of the default database, as a comma separated list of hosts.
+# Safe requests to views with read_from_replica = True read from them, see
+# core.routers
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(","))):
+    alias = f"replica_{index}"
+    DATABASES[alias] = dict(DATABASES["default"], HOST=host, TEST={"MIRROR": "default"})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+
+# Seconds a client reads from the primary after a write, so it sees its own
+# writes despite replication lag
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
+# PBKDF2 iterations of new password hashes, existing hashes are upgraded or
+# downgraded on the next login. Tune it to the login rate a core must handle
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", 120000))
+
+PASSWORD_HASHERS = [
+    "core.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.BCryptPasswordHasher",
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -131,12 +194,71 @@ USE_TZ = True
 STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 
+# Token authenticated paths that skip BROWSER_MIDDLEWARE
+API_PATH_PREFIXES = ["/recipe/", "/user/", "/healthz", "/readyz", MEDIA_URL]
+STATICFILES_STORAGE = "core.storage.CompressedManifestStaticFilesStorage"
+# Swaps in plain static storage, the suite runs without collectstatic
+TEST_RUNNER = "core.runner.TestRunner"
+
 STATIC_ROOT = "/vol/web/static"
 MEDIA_ROOT = "/vol/web/media"
 
+# Internal nginx location media files are handed to after the ownership
+# check, set it empty to stream files from Django when running without nginx
+MEDIA_ACCEL_REDIRECT_URL = os.environ.get("MEDIA_ACCEL_REDIRECT_URL", "/protected-media/")
+
 
 AUTH_USER_MODEL = "core.User"
 
+# API tokens (core.AuthToken) expire after AUTH_TOKEN_TTL seconds without
+# use. Their expiry slides forward when used, written at most once per
+# AUTH_TOKEN_TOUCH_INTERVAL seconds
+AUTH_TOKEN_TTL = int(os.environ.get("AUTH_TOKEN_TTL", 30 * 24 * 3600))
+AUTH_TOKEN_TOUCH_INTERVAL = int(os.environ.get("AUTH_TOKEN_TOUCH_INTERVAL", 300))
+AUTH_TOKEN_MAX_PER_USER = int(os.environ.get("AUTH_TOKEN_MAX_PER_USER", 10))
+
+# Responses to POSTs with an Idempotency-Key are replayed for retries within
+# IDEMPOTENCY_KEY_TTL seconds. A key whose first request has not finished
+# after IDEMPOTENCY_LOCK_TIMEOUT seconds may be claimed again
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+
+# State every worker process must see, throttle counters and replica pins,
+# lives in the "shared" cache. gunicorn points SHARED_CACHE_LOCATION to a
+# directory on /dev/shm, see app.gunicorn_conf and core.cache
+SHARED_CACHE_LOCATION = os.environ.get("SHARED_CACHE_LOCATION")
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+        "TIMEOUT": 24 * 3600,
+    },
+}
+if SHARED_CACHE_LOCATION:
+    CACHES["shared"].update(
+        BACKEND="core.cache.SharedFileCache",
+        LOCATION=SHARED_CACHE_LOCATION,
+    )
+
+# Sliding-window rates, see core.throttling. "login" and "upload" apply to
+# the views with that throttle_scope
+REST_FRAMEWORK = {
+    "DEFAULT_THROTTLE_CLASSES": [
+        "core.throttling.UserThrottle",
+        "core.throttling.IPThrottle",
+        "core.throttling.ScopedThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "user": os.environ.get("THROTTLE_RATE_USER", "600/min"),
+        "ip": os.environ.get("THROTTLE_RATE_IP", "1200/min"),
+        "login": os.environ.get("THROTTLE_RATE_LOGIN", "10/min"),
+        "upload": os.environ.get("THROTTLE_RATE_UPLOAD", "60/hour"),
+    },
+    # Proxies in front of the app, whose X-Forwarded-For entries to trust
+    "NUM_PROXIES": int(os.environ["NUM_PROXIES"]) if "NUM_PROXIES" in os.environ else None,
+}
+
 
 SWAGGER_SETTINGS = {
     "DOC_EXPANSION": "list",
@@ -145,4 +267,54 @@ SWAGGER_SETTINGS = {
         "api_key": {"type": "apiKey", "in": "header", "name": "Authorization"}
     },
 }
-FILE_UPLOAD_MAX_MEMORY_SIZE = 20971520
+
+# Precomputed OpenAPI schema served at /docs/, see core.schema
+SCHEMA_TITLE = "Recipe project swagger"
+SCHEMA_PATH = os.environ.get("SCHEMA_PATH", os.path.join(STATIC_ROOT, "openapi.json"))
+
+# Limits of recipe image uploads, see recipe.uploads
+IMAGE_UPLOAD_MAX_BYTES = int(os.environ.get("IMAGE_UPLOAD_MAX_BYTES", 20971520))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.environ.get("IMAGE_UPLOAD_MAX_PIXELS", 50000000))
+IMAGE_UPLOAD_SPOOL_SIZE = int(os.environ.get("IMAGE_UPLOAD_SPOOL_SIZE", 262144))
+IMAGE_UPLOAD_SNIFF_BYTES = int(os.environ.get("IMAGE_UPLOAD_SNIFF_BYTES", 262144))
+IMAGE_UPLOAD_FORMATS = os.environ.get("IMAGE_UPLOAD_FORMATS", "JPEG,PNG,WEBP,GIF").split(",")
+
+# Per-process in-memory autocomplete index for tag and ingredient names
+AUTOCOMPLETE_CACHE = bool(int(os.environ.get("AUTOCOMPLETE_CACHE", 0)))
+AUTOCOMPLETE_CACHE_TTL = int(os.environ.get("AUTOCOMPLETE_CACHE_TTL", 60))
+# Indexes each process keeps, least recently used ones are dropped
+AUTOCOMPLETE_CACHE_SIZE = int(os.environ.get("AUTOCOMPLETE_CACHE_SIZE", 1000))
+
+# Per-process lifetime of the cached similar recipes matrices
+SIMILAR_RECIPES_CACHE_TTL = int(os.environ.get("SIMILAR_RECIPES_CACHE_TTL", 300))
+# Users whose matrices each process keeps, least recently used ones are dropped
+SIMILAR_RECIPES_CACHE_SIZE = int(os.environ.get("SIMILAR_RECIPES_CACHE_SIZE", 100))
+
+# Background processing of uploaded recipe images, 0 workers processes inline
+IMAGE_PROCESSING_WORKERS = int(os.environ.get("IMAGE_PROCESSING_WORKERS", 2))
+IMAGE_PROCESSING_QUEUE_SIZE = int(os.environ.get("IMAGE_PROCESSING_QUEUE_SIZE", 16))
+IMAGE_PROCESSING_TMP_DIR = os.environ.get("IMAGE_PROCESSING_TMP_DIR")
+# "forkserver" or "spawn", plain "fork" is unsafe from threaded workers
+IMAGE_PROCESSING_START_METHOD = os.environ.get("IMAGE_PROCESSING_START_METHOD", "forkserver")
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", 85))
+
+# Downscaled copies rendered for every uploaded recipe image, name -> max size
+IMAGE_VARIANTS = {"thumb": 160, "medium": 640, "large": 1280}
+IMAGE_VARIANT_FORMATS = ("webp", "jpeg")
+
+# Background deletion of user accounts, see core.deletion. 0 workers delete
+# inline
+USER_DELETION_WORKERS = int(os.environ.get("USER_DELETION_WORKERS", 1))
+USER_DELETION_BATCH_SIZE = int(os.environ.get("USER_DELETION_BATCH_SIZE", 500))
+USER_DELETION_CLAIM_TIMEOUT = int(os.environ.get("USER_DELETION_CLAIM_TIMEOUT", 300))
+
+# Response compression, see core.middleware.CompressionMiddleware
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 4))
+
+# Requests in progress across all workers beyond which new ones get a 503,
+# 0 disables the limit, see core.middleware.ConcurrencyLimitMiddleware
+MAX_IN_FLIGHT_REQUESTS = int(os.environ.get("MAX_IN_FLIGHT_REQUESTS", 0))
+LOAD_SHED_RETRY_AFTER = int(os.environ.get("LOAD_SHED_RETRY_AFTER", 1))
+LOAD_SHED_EXEMPT_PATHS = ["/healthz", "/readyz"]
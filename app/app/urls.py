@@ -1,17 +1,28 @@
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
-from rest_framework_swagger.views import get_swagger_view
-from django.conf.urls.static import static
 from django.conf import settings
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
-schema_view = get_swagger_view(title="Recipe project swagger")
+from core.views import healthz, readyz
+from recipe.views import RecipeMediaView
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
     path("user/", include("user.urls")),
     path("recipe/", include("recipe.urls")),
-    path("docs/", schema_view),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path("healthz", healthz, name="healthz"),
+    path("readyz", readyz, name="readyz"),
+    path(settings.MEDIA_URL.lstrip("/") + "<path:name>", RecipeMediaView.as_view(), name="media"),
+]
+
+# Left out of the API_ONLY settings profile
+if apps.is_installed("django.contrib.admin"):
+    from django.contrib import admin
+
+    urlpatterns.append(path("admin/", admin.site.urls))
+
+if apps.is_installed("rest_framework_swagger"):
+    from core.docs import SwaggerSchemaView
+
+    urlpatterns.append(path("docs/", SwaggerSchemaView.as_view(), name="docs"))
 
 urlpatterns += staticfiles_urlpatterns()
@@ -3,12 +3,13 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext as _
 
 
-from core import models
+from core import deletion, models
 
 
 class UserAdmin(BaseUserAdmin):
     ordering = ["id"]
     list_display = ["email", "name"]
+    list_filter = BaseUserAdmin.list_filter + ("deletion_requested",)
     fieldsets = (
         (None, {"fields": ("email", "password")}),
         (_("Personal Info"), {"fields": ("name",)}),
@@ -26,8 +27,24 @@ class UserAdmin(BaseUserAdmin):
         ),
     )
 
+    def delete_model(self, request, obj):
+        deletion.request_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            deletion.request_deletion(user)
+
 
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
 admin.site.register(models.Recipe)
+
+
+class AuthTokenAdmin(admin.ModelAdmin):
+    list_display = ["key", "user", "device", "last_used", "expires"]
+    search_fields = ["user__email"]
+    raw_id_fields = ["user"]
+
+
+admin.site.register(models.AuthToken, AuthTokenAdmin)
@@ -0,0 +1,34 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.models import AuthToken
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """Token authentication with expiring, sliding tokens of core.AuthToken
+
+    Tokens are read from the primary database, since one issued a moment
+    ago may not have reached the replicas yet.
+    """
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        try:
+            token = (
+                AuthToken.objects.using(DEFAULT_DB_ALIAS).select_related("user").get(key=key)
+            )
+        except AuthToken.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        now = timezone.now()
+        if token.expires <= now:
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        token.touch(now)
+        return (token.user, token)
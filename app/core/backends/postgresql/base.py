@@ -0,0 +1,141 @@
+"""PostgreSQL backend with managed connection lifecycle.
+
+Extends Django's backend with three settings of a ``DATABASES`` entry:
+
+``CONN_HEALTH_CHECKS``
+    Persistent connections (``CONN_MAX_AGE``) are checked with ``SELECT 1``
+    the first time they are used in a request and replaced if broken.
+``POOL_SIZE``
+    Keep up to this many idle connections in a per-process pool shared by
+    the threads of a worker. Closing a healthy connection returns it to the
+    pool; use it together with ``CONN_MAX_AGE = 0``.
+
+Connections that raised an error are recycled at the end of the request
+unless they still answer a probe. Counters of what happened to the
+connections of this worker are available from ``connection_metrics()``.
+"""
+import logging
+import os
+import queue
+import threading
+from collections import Counter
+
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+logger = logging.getLogger(__name__)
+
+_metrics = Counter()
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Forked workers must not share connections or counters with the parent"""
+    _pools.clear()
+    _metrics.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def connection_metrics():
+    """Return the connection counters of this worker process"""
+    return dict(_metrics, pid=os.getpid())
+
+
+def get_pool(alias, size):
+    """Return the idle connection pool of an alias"""
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = queue.LifoQueue(maxsize=size)
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_enabled = self.settings_dict.get("CONN_HEALTH_CHECKS", False)
+        self.health_check_done = False
+        self.pool_size = self.settings_dict.get("POOL_SIZE", 0)
+
+    def get_new_connection(self, conn_params):
+        if self.pool_size:
+            pool = get_pool(self.alias, self.pool_size)
+            while True:
+                try:
+                    connection, self.isolation_level = pool.get_nowait()
+                except queue.Empty:
+                    break
+                if not connection.closed:
+                    _metrics["pool_hits"] += 1
+                    # Idle time in the pool may have broken the connection
+                    self.health_check_done = False
+                    return connection
+        connection = super().get_new_connection(conn_params)
+        self.health_check_done = True
+        _metrics["opened"] += 1
+        logger.debug("Opened connection to %s in process %s", self.alias, os.getpid())
+        return connection
+
+    def health_check(self):
+        """Replace the connection if it no longer answers"""
+        self.health_check_done = True
+        if not self.health_check_enabled or self.in_atomic_block:
+            return
+        _metrics["health_checks"] += 1
+        if not self.is_usable():
+            _metrics["health_check_failures"] += 1
+            self.errors_occurred = True
+            self.close()
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.health_check_done:
+            self.health_check()
+        if self.connection is None:
+            super().ensure_connection()
+            if not self.health_check_done:
+                self.health_check()
+                super().ensure_connection()
+
+    def _reusable(self):
+        return (
+            not self.errors_occurred
+            and not self.in_atomic_block
+            and self.connection.closed == 0
+            and self.connection.get_transaction_status() == TRANSACTION_STATUS_IDLE
+            and self.autocommit == self.settings_dict["AUTOCOMMIT"]
+        )
+
+    def _close(self):
+        if self.connection is None:
+            return None
+        if self.pool_size and self._reusable():
+            try:
+                get_pool(self.alias, self.pool_size).put_nowait(
+                    (self.connection, self.isolation_level)
+                )
+            except queue.Full:
+                pass
+            else:
+                _metrics["pool_returns"] += 1
+                return None
+        _metrics["closed"] += 1
+        return super()._close()
+
+    def close_if_unusable_or_obsolete(self):
+        """Recycle broken connections and schedule the next health check
+
+        Called by Django at the start and end of every request.
+        """
+        # get_autocommit() below must not trigger a health check
+        self.health_check_done = True
+        if self.connection is not None and self.errors_occurred:
+            if self.is_usable():
+                self.errors_occurred = False
+            else:
+                _metrics["recycled"] += 1
+                self.close()
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
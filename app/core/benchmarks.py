@@ -0,0 +1,373 @@
+"""Performance benchmark scenarios run by ``manage.py benchmark``.
+
+Each scenario seeds its own data inside a transaction that is rolled back
+afterwards (unless ``--keep`` is given) and reports timings of the hot path
+it exercises.
+"""
+import os
+import random
+import socket
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import import_module
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from core import search
+from core.models import Ingredient, Recipe, Tag
+
+
+SCENARIOS = {}
+
+WORDS = (
+    "chicken beef pork tofu salmon rice pasta noodle potato tomato onion garlic "
+    "ginger basil lemon lime chili pepper cheese butter cream egg flour sugar "
+    "honey mushroom spinach kale carrot curry soup salad stew roast grill bake"
+).split()
+
+
+def scenario(name):
+    """Register a benchmark scenario under the given name"""
+
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+
+    return decorator
+
+
+def timed(func, repeat):
+    """Call func repeat times and return timing stats in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1],
+    }
+
+
+def format_stats(label, stats):
+    return "{:<32} min {min:9.2f} ms  median {median:9.2f} ms  p95 {p95:9.2f} ms  max {max:9.2f} ms".format(
+        label, **stats
+    )
+
+
+def seed_recipes(size, tags=200, ingredients=2000, batch_size=10000, email="bench@test.com"):
+    """Bulk create a user owning size recipes with random tags and ingredients"""
+    rnd = random.Random(size)
+    user = get_user_model().objects.create_user(email=email, password="benchpass")  # type: ignore
+    tag_objs = Tag.objects.bulk_create(
+        Tag(user=user, name=f"{rnd.choice(WORDS)} {i}") for i in range(tags)
+    )
+    ingredient_objs = Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f"{rnd.choice(WORDS)} {i}") for i in range(ingredients)
+    )
+    if not tag_objs[0].pk:
+        tag_objs = list(Tag.objects.filter(user=user))
+        ingredient_objs = list(Ingredient.objects.filter(user=user))
+
+    tag_through = Recipe.tags.through
+    ingredient_through = Recipe.ingredients.through
+    for offset in range(0, size, batch_size):
+        count = min(batch_size, size - offset)
+        Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=" ".join(rnd.sample(WORDS, 3)),
+                time_minutes=rnd.randint(5, 180),
+                price=rnd.randint(100, 99999) / 100,
+            )
+            for _ in range(count)
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(user=user).order_by("-id").values_list("id", flat=True)[:count]
+        )
+        tag_through.objects.bulk_create(
+            tag_through(recipe_id=recipe_id, tag_id=tag.pk)
+            for recipe_id in recipe_ids
+            for tag in rnd.sample(tag_objs, 2)
+        )
+        ingredient_through.objects.bulk_create(
+            ingredient_through(recipe_id=recipe_id, ingredient_id=ingredient.pk)
+            for recipe_id in recipe_ids
+            for ingredient in rnd.sample(ingredient_objs, 6)
+        )
+    return user
+
+
+@scenario("search")
+def search_scenario(stdout, size, repeat):
+    """Full-text recipe search over a large account"""
+    size = size or 1000000
+    start = time.perf_counter()
+    user = seed_recipes(size)
+    stdout.write(f"Seeded {size} recipes in {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    search.update_documents()
+    stdout.write(f"Built search index in {time.perf_counter() - start:.1f} s")
+
+    queryset = Recipe.objects.filter(user=user)
+    for text in ("chicken", "garlic lemon", "curry 17", "nothingmatches"):
+        stats = timed(lambda: list(search.search(queryset, text)[:20]), repeat)
+        stdout.write(format_stats(f"search {text!r} top 20", stats))
+
+    recipe = queryset.first()
+    stats = timed(lambda: search.update_documents([recipe.pk]), repeat)
+    stdout.write(format_stats("incremental document update", stats))
+
+
+@scenario("autocomplete")
+def autocomplete_scenario(stdout, size, repeat):
+    """Tag/ingredient name autocomplete over a large account"""
+    from django.test import override_settings
+
+    from recipe import autocomplete
+
+    size = size or 50000
+    rnd = random.Random(size)
+    user = get_user_model().objects.create_user(email="bench@test.com", password="benchpass")  # type: ignore
+    Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=" ".join(rnd.sample(WORDS, 2)) + f" {i}") for i in range(size)
+    )
+    queryset = Ingredient.objects.all()
+    for cached in (False, True):
+        with override_settings(AUTOCOMPLETE_CACHE=cached):
+            autocomplete.invalidate(Ingredient, user.pk)
+            stats = timed(lambda: autocomplete.suggest(queryset, user, "ch", 10), 1)
+            stdout.write(format_stats(f"first call (cache={cached})", stats))
+            for text in ("c", "chi", "garlic l", "zzz"):
+                stats = timed(lambda: autocomplete.suggest(queryset, user, text, 10), repeat)
+                stdout.write(format_stats(f"suggest {text!r} (cache={cached})", stats))
+
+
+@scenario("cookable")
+def cookable_scenario(stdout, size, repeat):
+    """Recipe lookup by ingredients on hand over a large account"""
+    from rest_framework.test import APIClient
+
+    size = size or 50000
+    user = seed_recipes(size)
+    client = APIClient()
+    client.force_authenticate(user)
+    ingredient_ids = list(Ingredient.objects.filter(user=user).values_list("id", flat=True))
+    rnd = random.Random(size)
+    for on_hand in (10, 100, 500):
+        ids = ",".join(str(pk) for pk in rnd.sample(ingredient_ids, on_hand))
+        for missing in (0, 2):
+            stats = timed(
+                lambda: client.get(
+                    "/recipe/recipes/cookable/", {"ingredients": ids, "missing": missing}
+                ),
+                repeat,
+            )
+            stdout.write(format_stats(f"{on_hand} on hand, missing <= {missing}", stats))
+
+
+@scenario("similar")
+def similar_scenario(stdout, size, repeat):
+    """Similar recipes top-k over a large account"""
+    from recipe import similarity
+
+    size = size or 20000
+    user = seed_recipes(size)
+    recipe_ids = list(Recipe.objects.filter(user=user).values_list("id", flat=True)[:repeat])
+    similarity.invalidate(user.pk)
+    stats = timed(lambda: similarity.get_matrix(user), 1)
+    stdout.write(format_stats("build matrix", stats))
+    recipes = iter(Recipe.objects.filter(id__in=recipe_ids))
+    stats = timed(lambda: similarity.similar_recipes(next(recipes), 10), len(recipe_ids))
+    stdout.write(format_stats("top 10 similar (cached)", stats))
+
+
+@scenario("connections")
+def connections_scenario(stdout, size, repeat):
+    """Per-request connection overhead with and without persistent connections"""
+    from django.db import connections
+
+    size = size or 200
+    default = connections["default"]
+    variants = (
+        ("new connection per request", {"CONN_MAX_AGE": 0}),
+        ("persistent", {"CONN_MAX_AGE": 600}),
+        ("persistent + health checks", {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True}),
+        ("pool of 4", {"CONN_MAX_AGE": 0, "POOL_SIZE": 4}),
+    )
+    for index, (label, options) in enumerate(variants):
+        alias = f"benchmark_{index}"
+        connections.databases[alias] = dict(default.settings_dict, **options)
+        conn = connections[alias]
+
+        def request():
+            # What Django does around every request, see close_old_connections
+            conn.close_if_unusable_or_obsolete()
+            for _ in range(3):
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            conn.close_if_unusable_or_obsolete()
+
+        stats = timed(request, size)
+        conn.close()
+        del connections[alias]
+        del connections.databases[alias]
+        stdout.write(format_stats(label, stats))
+
+    connection_metrics = getattr(import_module(type(default).__module__), "connection_metrics", None)
+    if connection_metrics is not None:
+        stdout.write(f"Connection metrics: {connection_metrics()}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(server, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def fetch_ms(url):
+    """GET url and return how long it took in milliseconds"""
+    start = time.perf_counter()
+    try:
+        urlopen(url, timeout=10).read()
+    except HTTPError as exc:
+        exc.read()
+    return (time.perf_counter() - start) * 1000
+
+
+@scenario("gunicorn")
+def gunicorn_scenario(stdout, size, repeat):
+    """Throughput of gunicorn with its defaults and with app.gunicorn_conf"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    size = size or 2000
+    concurrency = 16
+    paths = ("/healthz", "/readyz", "/recipe/recipes/", "/docs/?format=openapi")
+    config = ["-c", "python:app.gunicorn_conf"]
+    variants = (
+        ("defaults", [], {}),
+        ("app.gunicorn_conf", config, {}),
+        ("app.gunicorn_conf, no preload", config, {"GUNICORN_PRELOAD": "0"}),
+        ("app.gunicorn_conf, 2 threads", config, {"GUNICORN_THREADS": "2"}),
+    )
+    shared_cache = tempfile.mkdtemp()
+    for label, options, overrides in variants:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, GUNICORN_BIND=f"127.0.0.1:{port}", GUNICORN_LOGLEVEL="warning")
+        # Measure the server, not the per-address throttle
+        env.update(THROTTLE_RATE_IP="1000000/min", THROTTLE_RATE_USER="1000000/min")
+        # The same shared cache for every variant, only gunicorn settings differ
+        env.update(SHARED_CACHE_LOCATION=shared_cache)
+        env.update(overrides)
+        command = [sys.executable, "-c", "from gunicorn.app.wsgiapp import run; run()"]
+        command += [*options, "--bind", env["GUNICORN_BIND"]]
+        server = subprocess.Popen(
+            command + ["app.wsgi:application"], cwd=settings.BASE_DIR, env=env
+        )
+        try:
+            start = time.perf_counter()
+            wait_for_server(server, base_url + "/healthz")
+            ready = time.perf_counter() - start
+            first = fetch_ms(base_url + paths[-1])
+            stdout.write(f"{label}: ready in {ready:.2f} s, first schema request {first:.1f} ms")
+
+            def fetch(index):
+                return fetch_ms(base_url + paths[index % len(paths)])
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                samples = sorted(executor.map(fetch, range(size)))
+            elapsed = time.perf_counter() - start
+            stdout.write(
+                "{:<32} {:8.0f} req/s  median {:7.2f} ms  p95 {:7.2f} ms".format(
+                    label,
+                    size / elapsed,
+                    statistics.median(samples),
+                    samples[int(len(samples) * 0.95)],
+                )
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    shutil.rmtree(shared_cache, ignore_errors=True)
+
+
+@scenario("middleware")
+def middleware_scenario(stdout, size, repeat):
+    """Per-request cost of the middleware stack on API paths"""
+    from django.core.handlers.base import BaseHandler
+    from django.test import RequestFactory, override_settings
+    from core.models import AuthToken
+
+    size = size or 2000
+    user = get_user_model().objects.create_user(email="bench@test.com", password="benchpass")  # type: ignore
+    token = AuthToken.objects.issue(user)
+    # What every request used to go through
+    full_stack = []
+    for name in settings.MIDDLEWARE:
+        if name == "core.middleware.BrowserMiddleware":
+            full_stack.extend(settings.BROWSER_MIDDLEWARE)
+        else:
+            full_stack.append(name)
+    factory = RequestFactory()
+    requests = (
+        ("/healthz", {}),
+        ("/recipe/tags/", {"HTTP_AUTHORIZATION": f"Token {token.key}"}),
+    )
+    for label, middleware in (("full stack", full_stack), ("path routed", settings.MIDDLEWARE)):
+        with override_settings(MIDDLEWARE=middleware):
+            handler = BaseHandler()
+            handler.load_middleware()
+            for path, headers in requests:
+                stats = timed(lambda: handler.get_response(factory.get(path, **headers)), size)
+                stdout.write(format_stats(f"{label} {path}", stats))
+
+
+@scenario("logins")
+def logins_scenario(stdout, size, repeat):
+    """Logins per second on one core at different password hashing costs"""
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    email, password = "bench@test.com", "benchpass"
+    get_user_model().objects.create_user(email=email, password=password)  # type: ignore
+    client = APIClient()
+    payload = {"email": email, "password": password}
+    for iterations in (settings.PASSWORD_HASH_ITERATIONS, 36000, 10000):
+        with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+            # The first login rehashes the password for the new cost
+            client.post("/user/token/", payload)
+            stats = timed(lambda: client.post("/user/token/", payload), repeat)
+        stdout.write(
+            format_stats(f"password, {iterations} iterations", stats)
+            + f"  {1000 / stats['median']:7.1f} logins/s"
+        )
+    token = client.post("/user/token/", payload).data["token"]
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+    stats = timed(lambda: client.post("/user/token/", {"email": email}), repeat)
+    stdout.write(
+        format_stats("token reuse", stats) + f"  {1000 / stats['median']:7.1f} logins/s"
+    )
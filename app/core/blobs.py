@@ -0,0 +1,166 @@
+"""Content-addressed, reference-counted storage of recipe images.
+
+Each unique processed image is stored once under its SHA-256 digest (see
+``recipe_image_blob_path``) and tracked by an ``ImageBlob`` row counting the
+recipes whose ``image`` points at it. The file is deleted when the last
+reference is released. ``ImageBlob.source_digest`` is the digest of the
+raw upload, so uploading a known file again can reuse the stored blob
+without processing it.
+
+Existing files are only relied on while holding the blob's row lock, the
+lock ``gc_media`` takes before deleting a file it found unreferenced.
+"""
+import os
+from contextlib import contextmanager
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+
+from core.models import ImageBlob, Recipe, RecipeImageVariant, recipe_image_blob_path
+
+
+def get_storage():
+    return Recipe._meta.get_field("image").storage
+
+
+def store(path, digest, source_digest):
+    """Store the file at path under its digest and take a reference to it
+
+    Returns the storage name of the blob.
+    """
+    storage = get_storage()
+    name = recipe_image_blob_path(digest, os.path.splitext(path)[1])
+    with transaction.atomic():
+        blob, _ = ImageBlob.objects.select_for_update().get_or_create(
+            name=name,
+            defaults={"source_digest": source_digest or "", "size": os.path.getsize(path)},
+        )
+        if not storage.exists(name):
+            with open(path, "rb") as content:
+                saved = storage.save(name, File(content))
+            if saved != name:
+                # Another process stored the same content concurrently
+                storage.delete(saved)
+        ImageBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1)
+    return name
+
+
+def store_variants(name, files):
+    """Save the files rendered from a blob, given as storage name -> local path
+
+    Files stored before are kept as they are.
+    """
+    storage = get_storage()
+    with transaction.atomic():
+        # Lock the blob, see orphans()
+        ImageBlob.objects.select_for_update().filter(name=name).first()
+        for variant_name, path in files.items():
+            if storage.exists(variant_name):
+                continue
+            with open(path, "rb") as content:
+                saved = storage.save(variant_name, File(content))
+            if saved != variant_name:
+                storage.delete(saved)
+
+
+def find(source_digest):
+    """Return a stored blob produced from an upload with this digest, if any"""
+    if not source_digest:
+        return None
+    blob = ImageBlob.objects.filter(source_digest=source_digest, ref_count__gt=0).first()
+    if blob is None or not get_storage().exists(blob.name):
+        return None
+    return blob
+
+
+def acquire(name):
+    """Take another reference to a stored blob, return False if it is gone"""
+    with transaction.atomic():
+        return bool(
+            ImageBlob.objects.select_for_update()
+            .filter(name=name, ref_count__gt=0)
+            .update(ref_count=F("ref_count") + 1)
+        )
+
+
+def variant_names(name):
+    """Return the stored variant files rendered from a blob
+
+    Variants live next to the blob as ``<digest>.<variant>.<hash><ext>``,
+    see ``recipe_image_variant_path``.
+    """
+    storage = get_storage()
+    directory, filename = os.path.split(name)
+    prefix = os.path.splitext(filename)[0] + "."
+    try:
+        files = storage.listdir(directory)[1]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, file) for file in files if file.startswith(prefix)]
+
+
+def release(name):
+    """Drop a reference to a blob, deleting the file with the last one"""
+    if not name:
+        return
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            # Not a content-addressed file
+            return
+        if blob.ref_count > 1:
+            ImageBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") - 1)
+            return
+        # Deleted while holding the row lock so that a concurrent store()
+        # of the same content waits and writes the file again
+        storage = get_storage()
+        storage.delete(name)
+        for variant_name in variant_names(name):
+            storage.delete(variant_name)
+        blob.delete()
+
+
+def referenced_names(names):
+    """Return the subset of storage names still referenced in the database"""
+    found = set(Recipe.objects.filter(image__in=names).values_list("image", flat=True))
+    found.update(
+        RecipeImageVariant.objects.filter(image__in=names).values_list("image", flat=True)
+    )
+    found.update(
+        ImageBlob.objects.filter(name__in=names, ref_count__gt=0).values_list(
+            "name", flat=True
+        )
+    )
+    return found
+
+
+@contextmanager
+def orphans(names):
+    """Lock files found unreferenced and yield those that still are
+
+    The files must be deleted before the block exits. Blob files are locked
+    through their row, created for the time being when missing, so that a
+    concurrent store() of the same content waits and then writes the file
+    again. Variant files are locked through the blob they were rendered
+    from, and are kept while that blob is in use, see store_variants().
+    """
+    with transaction.atomic():
+        in_use = set()
+        for name in sorted(names):
+            directory, filename = os.path.split(name)
+            if filename.count(".") == 1:
+                blob, _ = ImageBlob.objects.select_for_update().get_or_create(
+                    name=name, defaults={"size": 0}
+                )
+                if blob.ref_count > 0:
+                    in_use.add(name)
+            else:
+                prefix = os.path.join(directory, filename.split(".", 1)[0] + ".")
+                blobs = ImageBlob.objects.select_for_update().filter(name__startswith=prefix)
+                if any(blob.ref_count > 0 for blob in blobs):
+                    in_use.add(name)
+        found = [name for name in names if name not in in_use]
+        found = [name for name in found if name not in referenced_names(found)]
+        yield found
+        ImageBlob.objects.filter(name__in=names, ref_count=0).delete()
@@ -0,0 +1,86 @@
+"""Caches of the worker processes.
+
+``SharedFileCache`` is the cache backend for state shared by the worker
+processes of one host, ``LRUCache`` keeps expensive per-process values.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class SharedFileCache(FileBasedCache):
+    """File cache that never evicts live entries
+
+    Django's file cache lists its whole directory on every set() and, past
+    MAX_ENTRIES, deletes random entries, which would reset the windows of
+    throttled clients. This one only deletes expired files, in a sweep
+    run at most every SWEEP_INTERVAL seconds per process.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._sweep_interval = params.get("OPTIONS", {}).get("SWEEP_INTERVAL", 60)
+        self._last_sweep = time.monotonic()
+
+    def _cull(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self._sweep_interval:
+            return
+        self._last_sweep = now
+        for fname in self._list_cache_files():
+            try:
+                with open(fname, "rb") as f:
+                    # Deletes the file when it has expired
+                    self._is_expired(f)
+            except FileNotFoundError:
+                pass
+
+
+class LRUCache:
+    """Thread-safe per-process cache of the most recently used values
+
+    Values are rebuilt once older than the ``ttl_setting`` seconds, and only
+    the ``size_setting`` most recently used ones are kept. Both settings are
+    read on every call.
+    """
+
+    def __init__(self, size_setting, default_size, ttl_setting, default_ttl):
+        self.size_setting = size_setting
+        self.default_size = default_size
+        self.ttl_setting = ttl_setting
+        self.default_ttl = default_ttl
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._values))
+
+    def get_or_build(self, key, build):
+        """Return the cached value of key, calling build() when missing or expired"""
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None:
+                self._values.move_to_end(key)
+        ttl = getattr(settings, self.ttl_setting, self.default_ttl)
+        if entry is not None and time.monotonic() - entry[0] <= ttl:
+            return entry[1]
+        # Built outside the lock, concurrent misses may build it twice
+        value = build()
+        with self._lock:
+            self._values[key] = (time.monotonic(), value)
+            self._values.move_to_end(key)
+            while len(self._values) > getattr(settings, self.size_setting, self.default_size):
+                self._values.popitem(last=False)
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
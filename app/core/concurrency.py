@@ -0,0 +1,76 @@
+"""Count of requests in progress, shared between forked worker processes.
+
+Every worker process counts its requests in its own slot of an array in
+shared memory, so no lock is ever shared between processes: a worker
+killed in the middle of a request cannot block the others. The total is
+the sum of all slots. Two workers admitting a request at the same moment
+may overshoot the limit by one each, which is fine for load shedding.
+
+Under gunicorn the array is allocated in the master before workers are
+forked, which then assigns a slot to each worker and clears it when the
+worker exits, see ``app.gunicorn_conf``. Elsewhere, such as under
+runserver or in tests, each process lazily gets an array of its own.
+Nothing is allocated, and multiprocessing is not imported, unless the
+limit is enabled.
+"""
+import threading
+
+SLOTS = 256
+
+_counts = None
+_assigned = set()
+_slot = 0
+_lock = threading.Lock()
+
+
+def setup():
+    """Allocate the counters, before forking to share them"""
+    global _counts
+    if _counts is None:
+        from multiprocessing.sharedctypes import RawArray
+
+        _counts = RawArray("i", SLOTS)
+    return _counts
+
+
+def assign_slot():
+    """Reserve a slot for a worker about to be forked, runs in the master"""
+    setup()
+    for index in range(SLOTS):
+        if index not in _assigned:
+            _assigned.add(index)
+            return index
+    raise RuntimeError(f"More than {SLOTS} worker processes")
+
+
+def use_slot(index):
+    """Count the requests of this process in the given slot"""
+    global _slot
+    _slot = index
+    setup()[index] = 0
+
+
+def release_slot(index):
+    """Forget the requests an exited worker left in progress"""
+    _assigned.discard(index)
+    setup()[index] = 0
+
+
+def acquire(limit):
+    """Count a new request unless ``limit`` requests are already in progress"""
+    counts = setup()
+    with _lock:
+        if sum(counts) >= limit:
+            return False
+        counts[_slot] += 1
+        return True
+
+
+def release():
+    with _lock:
+        if _counts[_slot] > 0:
+            _counts[_slot] -= 1
+
+
+def in_flight():
+    return sum(_counts) if _counts is not None else 0
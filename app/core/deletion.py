@@ -0,0 +1,191 @@
+"""Background deletion of user accounts.
+
+Deleting a user through the ORM collects every recipe, tag, ingredient and
+relation row in Python before deleting them in one long transaction.
+``request_deletion()`` instead deactivates the account and revokes its
+tokens right away, then ``delete_user()`` removes the data in a background
+thread: related rows go in batches of USER_DELETION_BATCH_SIZE with plain
+``DELETE ... WHERE id IN (...)`` statements, each batch in its own short
+transaction, and the image files of deleted recipes are released. The
+``delete_users`` command finishes deletions interrupted by a restart.
+
+A job claims the account by stamping ``deletion_claimed`` with a
+conditional UPDATE and refreshes the stamp after every batch, so only one
+job at a time deletes an account. A claim older than
+USER_DELETION_CLAIM_TIMEOUT seconds belongs to a job that died and may be
+taken over.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import blobs, pool, search
+from core.models import (
+    AuthToken,
+    IdempotencyKey,
+    Ingredient,
+    Recipe,
+    RecipeImageVariant,
+    Tag,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _create_executor():
+    from concurrent.futures import ThreadPoolExecutor
+
+    return ThreadPoolExecutor(
+        max_workers=settings.USER_DELETION_WORKERS, thread_name_prefix="user-deletion"
+    )
+
+
+_executor = pool.LazyExecutor(_create_executor)
+
+
+def _raw_delete(queryset):
+    """Delete the rows of a queryset without collecting them or sending signals"""
+    return queryset._raw_delete(queryset.db)
+
+
+def _batches(queryset, batch_size):
+    """Yield lists of primary keys of the queryset until it is empty"""
+    while True:
+        ids = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+
+
+def _delete_recipes(ids):
+    """Delete recipes with their relations, variants and search documents
+
+    Images are released only for rows this call deleted, locked first so
+    that no one else releases them too.
+    """
+    with transaction.atomic():
+        images = list(
+            Recipe.objects.select_for_update()
+            .filter(pk__in=ids)
+            .values_list("image", flat=True)
+        )
+        _raw_delete(RecipeImageVariant.objects.filter(recipe_id__in=ids))
+        _raw_delete(Recipe.tags.through.objects.filter(recipe_id__in=ids))
+        _raw_delete(Recipe.ingredients.through.objects.filter(recipe_id__in=ids))
+        search.delete_documents(ids)
+        _raw_delete(Recipe.objects.filter(pk__in=ids))
+
+    # Releases variant files along with the last reference to an image
+    for name in images:
+        blobs.release(name)
+
+
+def _delete_attrs(model, through_field, ids):
+    """Delete tags or ingredients along with their recipe assignments"""
+    through = getattr(Recipe, through_field).through
+    with transaction.atomic():
+        _raw_delete(through.objects.filter(**{f"{model._meta.model_name}_id__in": ids}))
+        _raw_delete(model.objects.filter(pk__in=ids))
+
+
+def claim(user_id):
+    """Claim, or keep claiming, the deletion of an account for this job
+
+    Returns False when the account is not scheduled for deletion or another
+    job is deleting it.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.USER_DELETION_CLAIM_TIMEOUT)
+    return bool(
+        get_user_model()
+        .objects.filter(pk=user_id, deletion_requested__isnull=False)
+        .filter(Q(deletion_claimed__isnull=True) | Q(deletion_claimed__lt=stale))
+        .update(deletion_claimed=now)
+    )
+
+
+def _heartbeat(user_id):
+    get_user_model().objects.filter(pk=user_id).update(deletion_claimed=timezone.now())
+
+
+def delete_user(user_id, batch_size=None, progress=None):
+    """Delete a user scheduled for deletion and everything they own in batches
+
+    ``progress`` is called with the model name and the number of rows
+    deleted so far after every batch. Returns those totals, or None when
+    another job is already deleting the user.
+    """
+    if not claim(user_id):
+        return None
+    batch_size = batch_size or settings.USER_DELETION_BATCH_SIZE
+    totals = {}
+
+    def report(label, count):
+        _heartbeat(user_id)
+        totals[label] = totals.get(label, 0) + count
+        if progress is not None:
+            progress(label, totals[label])
+
+    for ids in _batches(Recipe.objects.filter(user_id=user_id), batch_size):
+        _delete_recipes(ids)
+        report("recipes", len(ids))
+    for model, through_field, label in (
+        (Tag, "tags", "tags"),
+        (Ingredient, "ingredients", "ingredients"),
+    ):
+        for ids in _batches(model.objects.filter(user_id=user_id), batch_size):
+            _delete_attrs(model, through_field, ids)
+            report(label, len(ids))
+    for model, label in ((AuthToken, "tokens"), (IdempotencyKey, "idempotency keys")):
+        for ids in _batches(model.objects.filter(user_id=user_id), batch_size):
+            report(label, _raw_delete(model.objects.filter(pk__in=ids)))
+
+    # Only small relations such as groups and permissions are left
+    get_user_model().objects.filter(pk=user_id).delete()
+    totals["users"] = 1
+    if progress is not None:
+        progress("users", 1)
+    return totals
+
+
+def _run(user_id):
+    """Delete a user in a background thread, logging progress"""
+    try:
+        totals = delete_user(
+            user_id,
+            progress=lambda label, count: logger.info(
+                "Deleting user %s: %s %s", user_id, count, label
+            ),
+        )
+        if totals is None:
+            logger.info("User %s is already being deleted by another job", user_id)
+        else:
+            logger.info("Deleted user %s: %s", user_id, totals)
+    except Exception:
+        logger.exception("Deleting user %s failed, delete_users will retry", user_id)
+    finally:
+        close_old_connections()
+
+
+def request_deletion(user):
+    """Deactivate a user right away and delete their data in the background
+
+    The job starts once the caller's transaction commits, so it never runs
+    for a deactivation that was rolled back.
+    """
+    with transaction.atomic():
+        get_user_model().objects.filter(pk=user.pk).update(
+            is_active=False, deletion_requested=timezone.now()
+        )
+        _raw_delete(AuthToken.objects.filter(user_id=user.pk))
+    user.is_active = False
+
+    if not settings.USER_DELETION_WORKERS:
+        delete_user(user.pk)
+        return
+    transaction.on_commit(lambda: _executor.submit(_run, user.pk))
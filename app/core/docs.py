@@ -0,0 +1,70 @@
+"""Swagger docs served from the precomputed schema of ``core.schema``"""
+import json
+
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_swagger.renderers import SwaggerUIRenderer
+from rest_framework_swagger.settings import swagger_settings
+
+from core import schema
+
+
+def etag_matches(etag, header):
+    """Weak comparison of an ETag with the tags of an If-None-Match header
+
+    Compressed responses carry the ETag as weak, see CompressionMiddleware.
+    """
+    etags = parse_etags(header)
+    if "*" in etags:
+        return True
+
+    def opaque(tag):
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return opaque(etag) in {opaque(tag) for tag in etags}
+
+
+class PrecomputedOpenAPIRenderer(BaseRenderer):
+    """Render an already encoded OpenAPI spec as it is"""
+
+    media_type = "application/openapi+json"
+    charset = None
+    format = "openapi"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class PrecomputedSwaggerUIRenderer(SwaggerUIRenderer):
+    """Swagger UI embedding an already encoded OpenAPI spec"""
+
+    def set_context(self, data, renderer_context):
+        renderer_context["USE_SESSION_AUTH"] = swagger_settings.USE_SESSION_AUTH
+        renderer_context.update(self.get_auth_urls())
+        renderer_context["drs_settings"] = json.dumps(self.get_ui_settings())
+        renderer_context["spec"] = data.decode()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if renderer_context["response"].status_code != status.HTTP_200_OK:
+            return b""
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class SwaggerSchemaView(APIView):
+    """Serve the precomputed swagger docs with ETag support"""
+
+    schema = None
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    renderer_classes = (PrecomputedSwaggerUIRenderer, PrecomputedOpenAPIRenderer)
+
+    def get(self, request):
+        spec, etag = schema.get_spec()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(etag, request.META.get("HTTP_IF_NONE_MATCH", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(spec, headers=headers)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 with the iteration count of PASSWORD_HASH_ITERATIONS
+
+    Hashes made with another count are upgraded the next time the user
+    logs in, since Django rehashes a password whenever must_update() says so.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,126 @@
+"""Idempotency-Key support for create endpoints.
+
+The first POST with a given key claims it by inserting an ``IdempotencyKey``
+row, the unique (scope, key) index serializes concurrent duplicates. Once
+the view has run its response is stored on the row, in the same
+transaction as the write itself, and replayed for every retry until the
+key expires after IDEMPOTENCY_KEY_TTL seconds. A retry thus costs one
+indexed lookup instead of a second write.
+
+Keys are scoped to the user, or for anonymous requests to the client
+address, so that callers cannot replay each other's responses.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.models import IdempotencyKey
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+# Headers set by the view that replays return too, the others are added
+# again when the replayed response is rendered
+REPLAYED_HEADERS = ("Location", "Content-Location", "Link")
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def error(detail, status_code):
+    return Response({"detail": detail}, status=status_code)
+
+
+class IdempotentCreateMixin:
+    """Replay the stored response of POSTs repeating an Idempotency-Key"""
+
+    def idempotency_scope(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        # Address as the throttles see it, honouring NUM_PROXIES, hashed to
+        # fit the column whatever X-Forwarded-For holds
+        ident = BaseThrottle().get_ident(request)
+        return "anonymous:" + hashlib.sha256(ident.encode()).hexdigest()[:32]
+
+    def claim(self, request, key, fingerprint):
+        """Return the row of an earlier request with the key, or a new one"""
+        scope = self.idempotency_scope(request)
+        now = timezone.now()
+        record = (
+            IdempotencyKey.objects.using(DEFAULT_DB_ALIAS).filter(scope=scope, key=key).first()
+        )
+        if record is not None:
+            stale_lock = record.status_code is None and (
+                now - record.created
+            ).total_seconds() > settings.IDEMPOTENCY_LOCK_TIMEOUT
+            if record.expires > now and not stale_lock:
+                return record, False
+            # Expired, or left behind by a request that never finished
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    scope=scope,
+                    key=key,
+                    user=request.user if request.user.is_authenticated else None,
+                    fingerprint=fingerprint,
+                    expires=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                ), True
+        except IntegrityError:
+            # A concurrent duplicate claimed it first
+            return IdempotencyKey.objects.using(DEFAULT_DB_ALIAS).get(scope=scope, key=key), False
+
+    def create(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return error("Idempotency-Key is too long.", status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        record, created = self.claim(request, key, fingerprint)
+        if not created:
+            if record.fingerprint != fingerprint:
+                return error(
+                    "Idempotency-Key was already used for a different request.",
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if record.status_code is None:
+                response = error(
+                    "A request with this Idempotency-Key is in progress.",
+                    status.HTTP_409_CONFLICT,
+                )
+                response["Retry-After"] = "1"
+                return response
+            response = Response(
+                json.loads(record.response_body),
+                status=record.status_code,
+                headers=json.loads(record.response_headers or "{}"),
+            )
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            with transaction.atomic():
+                response = super().create(request, *args, **kwargs)
+                record.status_code = response.status_code
+                record.response_body = json.dumps(response.data, cls=JSONEncoder)
+                record.response_headers = json.dumps(
+                    {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)}
+                )
+                record.save(update_fields=["status_code", "response_body", "response_headers"])
+        except Exception:
+            # Let a retry run the request again
+            record.delete()
+            raise
+        return response
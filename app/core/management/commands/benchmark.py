@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import benchmarks
+
+
+class Command(BaseCommand):
+    """Django command to run a performance benchmark scenario"""
+
+    help = "Run a performance benchmark scenario on throwaway data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(benchmarks.SCENARIOS))
+        parser.add_argument("--size", type=int, default=None, help="Dataset size")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per case")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep seeded data instead of rolling back"
+        )
+
+    def handle(self, *args, **options):
+        run = benchmarks.SCENARIOS[options["scenario"]]
+        self.stdout.write(f"Running {options['scenario']} benchmark...")
+        with transaction.atomic():
+            run(self.stdout, options["size"], options["repeat"])
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core import deletion
+
+
+class Command(BaseCommand):
+    """Django command to finish deleting accounts scheduled for deletion"""
+
+    help = "Delete the data of users deactivated for deletion in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        user_ids = get_user_model().objects.filter(
+            deletion_requested__isnull=False
+        ).values_list("pk", flat=True)
+        for user_id in list(user_ids):
+            totals = deletion.delete_user(
+                user_id,
+                batch_size=options["batch_size"],
+                progress=lambda label, count: self.stdout.write(
+                    f"User {user_id}: deleted {count} {label}"
+                ),
+            )
+            if totals is None:
+                self.stdout.write(f"User {user_id} is being deleted by another job, skipped")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Deleted user {user_id}: {totals}"))
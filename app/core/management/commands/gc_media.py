@@ -0,0 +1,117 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import blobs
+
+
+def walk_files(root):
+    """Yield paths of all files under root without listing whole trees in memory"""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    """Django command to remove media files no recipe refers to"""
+
+    help = "Delete or quarantine orphaned recipe images under MEDIA_ROOT"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report orphans")
+        parser.add_argument(
+            "--quarantine", metavar="DIR", help="Move orphans to DIR instead of deleting"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Skip files modified less than this many seconds ago",
+        )
+        parser.add_argument("--path", default="upload/recipe", help="Directory under MEDIA_ROOT")
+
+    def remove(self, path, name, quarantine):
+        if quarantine:
+            target = os.path.join(quarantine, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def handle(self, *args, **options):
+        root = os.path.join(settings.MEDIA_ROOT, options["path"])
+        cutoff = time.time() - options["min_age"]
+        dry_run = options["dry_run"]
+        quarantine = options["quarantine"]
+
+        scanned = orphans = orphan_bytes = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for batch in batched(walk_files(root), options["batch_size"]):
+                scanned += len(batch)
+                files = {}
+                for entry in batch:
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_mtime <= cutoff:
+                        name = os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                        files[name] = (entry.path, stat.st_size)
+                if not files:
+                    continue
+                referenced = blobs.referenced_names(list(files))
+                candidates = [name for name in files if name not in referenced]
+                if dry_run:
+                    found = candidates
+                else:
+                    # Checked again under the locks that uploads take before
+                    # relying on an existing file, see core.blobs
+                    with blobs.orphans(candidates) as found:
+                        jobs = [
+                            executor.submit(self.remove, files[name][0], name, quarantine)
+                            for name in found
+                        ]
+                        for job in jobs:
+                            job.result()
+                for name in found:
+                    orphans += 1
+                    orphan_bytes += files[name][1]
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"Orphan: {name}")
+
+        elapsed = time.perf_counter() - start
+        action = "Found" if dry_run else ("Quarantined" if quarantine else "Deleted")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} {orphans} orphaned files ({orphan_bytes} bytes) "
+                f"out of {scanned} scanned in {elapsed:.2f} s "
+                f"({scanned / elapsed if elapsed else 0:.0f} files/s)"
+            )
+        )
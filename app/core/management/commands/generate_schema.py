@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    """Django command to precompute the OpenAPI schema served at /docs/"""
+
+    help = "Write the OpenAPI schema to SCHEMA_PATH if the API has changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Regenerate even if the schema is up to date"
+        )
+
+    def handle(self, *args, **options):
+        spec, regenerated = schema.build(force=options["force"])
+        if regenerated:
+            message = f"Wrote schema ({len(spec)} bytes) to {settings.SCHEMA_PATH}"
+        else:
+            message = f"Schema at {settings.SCHEMA_PATH} is up to date"
+        self.stdout.write(self.style.SUCCESS(message))
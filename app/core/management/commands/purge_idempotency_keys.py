@@ -0,0 +1,10 @@
+from core.management.commands import purge_tokens
+from core.models import IdempotencyKey
+
+
+class Command(purge_tokens.Command):
+    """Django command to delete expired idempotency keys"""
+
+    help = "Delete expired Idempotency-Key responses in small batches"
+    model = IdempotencyKey
+    label = "idempotency keys"
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Django command to delete expired auth tokens"""
+
+    help = "Delete expired API tokens in small batches"
+    model = AuthToken
+    label = "tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches to spare the database",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # Short transactions on the expires index instead of one huge DELETE
+            keys = list(
+                self.model.objects.filter(expires__lte=now).values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not keys:
+                break
+            deleted += self.model.objects.filter(pk__in=keys).delete()[0]
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired {self.label}"))
@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def parse_importtime(output):
+    """Parse -X importtime output into (module, self us, cumulative us) rows"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    """Django command to profile imports of a fresh process loading the app"""
+
+    help = "Report per-module import times of a WSGI module, as python -X importtime"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", default="app.wsgi", help="Module to import")
+        parser.add_argument("--limit", type=int, default=30, help="Modules to list")
+        parser.add_argument(
+            "--sort", choices=("cumulative", "self"), default="cumulative", help="Sort key"
+        )
+        parser.add_argument(
+            "--with-urls",
+            action="store_true",
+            help="Also import the URLconf, as the first request or a warmed up worker does",
+        )
+        parser.add_argument(
+            "--top-level",
+            action="store_true",
+            help="Sum the time by top-level package instead of listing modules",
+        )
+
+    def handle(self, *args, **options):
+        code = f"import {options['module']}"
+        if options["with_urls"]:
+            code += f"; import {settings.ROOT_URLCONF}"
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        elapsed = time.perf_counter() - start
+        rows = parse_importtime(result.stderr)
+        if result.returncode:
+            errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+            raise CommandError("\n".join(errors[-20:]))
+
+        if options["top_level"]:
+            totals = {}
+            for name, self_us, _ in rows:
+                package = name.split(".")[0]
+                totals[package] = totals.get(package, 0) + self_us
+            table = [(package, total, total) for package, total in totals.items()]
+            sort_index = 1
+        else:
+            table = rows
+            sort_index = 2 if options["sort"] == "cumulative" else 1
+        table = sorted(table, key=lambda row: row[sort_index], reverse=True)
+
+        self.stdout.write(f"{'self ms':>10} {'cumul ms':>10}  module")
+        for name, self_us, cumulative_us in table[: options["limit"]]:
+            self.stdout.write(f"{self_us / 1000:10.1f} {cumulative_us / 1000:10.1f}  {name}")
+        total_us = sum(self_us for _, self_us, _ in rows)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(rows)} modules in {total_us / 1000:.1f} ms "
+                f"(process wall time {elapsed:.2f} s)"
+            )
+        )
@@ -1,22 +1,62 @@
+import random
 import time
-from django.db import connections
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
 from django.db.utils import OperationalError
 
-from django.core.management.base import BaseCommand
-
 
 class Command(BaseCommand):
     """Django command to pause execution until database is available"""
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--timeout", type=float, default=60, help="Give up after this many seconds"
+        )
+        parser.add_argument(
+            "--max-delay", type=float, default=2, help="Longest pause between attempts"
+        )
+        parser.add_argument(
+            "--wait-for-migrations",
+            action="store_true",
+            help="Also wait until all migrations are applied",
+        )
 
+    def probe(self, connection, migrations):
+        """Connect and run a query, return whether the database is ready"""
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        if migrations:
+            executor = MigrationExecutor(connection)
+            return not executor.migration_plan(executor.loader.graph.leaf_nodes())
+        return True
+
+    def handle(self, *args, **options):
         self.stdout.write("Waiting for database...")
-        db_conn = None
-        while not db_conn:
+        connection = connections[options["database"]]
+        start = time.monotonic()
+        delay = 0.05
+        while True:
             try:
-                db_conn = connections["default"]
-            except OperationalError:
-                self.stdout.write("Database unailable, waiting 5 second...")
-                time.sleep(5)
-        self.stdout.write(self.style.SUCCESS("Database available!"))
+                if self.probe(connection, options["wait_for_migrations"]):
+                    break
+                reason = "Migrations not applied"
+            except OperationalError as exc:
+                connection.close()
+                message = str(exc).strip().splitlines()
+                reason = "Database unavailable ({})".format(message[0] if message else exc)
+            elapsed = time.monotonic() - start
+            if elapsed >= options["timeout"]:
+                raise CommandError(f"{reason}, gave up after {elapsed:.1f} s")
+            # Exponential backoff with jitter so restarted replicas do not
+            # hammer the database in lockstep
+            pause = min(delay, options["max_delay"], options["timeout"] - elapsed)
+            pause *= random.uniform(0.5, 1)
+            self.stdout.write(f"{reason}, retrying in {pause:.2f} s...")
+            time.sleep(pause)
+            delay *= 2
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(f"Database available after {elapsed:.2f} s!"))
@@ -0,0 +1,240 @@
+import hashlib
+import re
+import zlib
+
+import brotli
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.module_loading import import_string
+
+from core import concurrency, routers
+
+COMPRESSIBLE_TYPES = re.compile(
+    r"^(text/|application/(json|javascript|xml|x-javascript)|application/[\w.+-]+\+(json|xml))"
+)
+
+
+def accepted_encodings(header):
+    """Return the encodings of an Accept-Encoding header with a non-zero q value"""
+    encodings = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0
+        if coding and q > 0:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+class GzipCompressor:
+    encoding = "gzip"
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(settings.COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush()
+
+    def process(self, chunk):
+        # Sync flush so that every chunk reaches the client right away
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    encoding = "br"
+
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.finish()
+
+    def process(self, chunk):
+        return self.compressor.process(chunk) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress text responses with brotli or gzip as negotiated by the client
+
+    Responses smaller than COMPRESSION_MIN_SIZE are sent as they are, since
+    compressing them costs more CPU than it saves on the wire. Streaming
+    responses are compressed chunk by chunk.
+    """
+
+    def get_compressor(self, request):
+        accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if "br" in accepted:
+            return BrotliCompressor()
+        if "gzip" in accepted:
+            return GzipCompressor()
+        return None
+
+    def process_response(self, request, response):
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if response.has_header("Content-Encoding") or response.status_code == 206:
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get("Content-Type", "")):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        compressor = self.get_compressor(request)
+        if compressor is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(
+                compressor, response.streaming_content
+            )
+            del response["Content-Length"]
+        else:
+            compressed = compressor.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = compressor.encoding
+        return response
+
+    def compress_stream(self, compressor, chunks):
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """Serve safe requests from database replicas, see core.routers
+
+    Clients are pinned to the primary in the ``shared`` cache, since their
+    next request is likely served by another worker process.
+    """
+
+    def pin_key(self, request):
+        """Identify the client by its credentials, falling back to its address"""
+        credentials = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(
+            settings.SESSION_COOKIE_NAME
+        )
+        client = credentials or request.META.get("REMOTE_ADDR", "")
+        return "replica-pin:" + hashlib.sha1(client.encode()).hexdigest()
+
+    def process_request(self, request):
+        routers.start_request(use_replica=False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "cls", None)
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in ("GET", "HEAD", "OPTIONS")
+            and getattr(view_class, "read_from_replica", False)
+        ):
+            pinned = caches["shared"].get(self.pin_key(request)) is not None
+            routers.start_request(use_replica=True, pinned=pinned)
+
+    def process_response(self, request, response):
+        if routers.end_request() and settings.DATABASE_REPLICAS:
+            caches["shared"].set(self.pin_key(request), True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+
+class BrowserMiddleware:
+    """Run BROWSER_MIDDLEWARE for every path except API_PATH_PREFIXES
+
+    The token authenticated API has no use for sessions, CSRF cookies or
+    messages, so requests under API_PATH_PREFIXES skip them entirely while
+    the admin and the docs keep the full stack, in the order listed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.view_middleware = []
+        self.exception_middleware = []
+        handler = get_response
+        for middleware_path in reversed(settings.BROWSER_MIDDLEWARE):
+            try:
+                instance = import_string(middleware_path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instance, "process_view"):
+                self.view_middleware.insert(0, instance.process_view)
+            if hasattr(instance, "process_exception"):
+                self.exception_middleware.append(instance.process_exception)
+            handler = convert_exception_to_response(instance)
+        self.browser_handler = handler
+        self.api_prefixes = tuple(settings.API_PATH_PREFIXES)
+
+    def is_api(self, request):
+        return request.path_info.startswith(self.api_prefixes)
+
+    def __call__(self, request):
+        if self.is_api(request):
+            return self.get_response(request)
+        return self.browser_handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_api(request):
+            return None
+        for process_view in self.view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_exception(self, request, exception):
+        if self.is_api(request):
+            return None
+        for process_exception in self.exception_middleware:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
+
+
+class ConcurrencyLimitMiddleware:
+    """Shed load with 503 responses beyond MAX_IN_FLIGHT_REQUESTS
+
+    Turning excess requests away right away lets clients retry elsewhere or
+    later instead of piling up behind a saturated database. Paths under
+    LOAD_SHED_EXEMPT_PATHS, the health checks, are always served.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MAX_IN_FLIGHT_REQUESTS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.exempt_prefixes = tuple(settings.LOAD_SHED_EXEMPT_PATHS)
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.exempt_prefixes):
+            return self.get_response(request)
+        if not concurrency.acquire(settings.MAX_IN_FLIGHT_REQUESTS):
+            response = JsonResponse(
+                {"detail": "Server is busy, try again later."}, status=503
+            )
+            response["Retry-After"] = str(settings.LOAD_SHED_RETRY_AFTER)
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            concurrency.release()
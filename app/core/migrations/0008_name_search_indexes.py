@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_name_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in ("core_tag", "core_ingredient"):
+        schema_editor.execute(
+            f"CREATE INDEX {table}_user_name_prefix "
+            f"ON {table} (user_id, upper(name::text) text_pattern_ops)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX {table}_name_trgm ON {table} USING gin (name gin_trgm_ops)"
+        )
+
+
+def drop_name_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in ("core_tag", "core_ingredient"):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_user_name_prefix")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_indexes, drop_name_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-19 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='deletion_requested',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
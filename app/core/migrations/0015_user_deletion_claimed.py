@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-19 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_user_deletion_requested'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='deletion_claimed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
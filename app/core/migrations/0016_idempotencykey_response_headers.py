@@ -0,0 +1,18 @@
+# Generated by Django 2.1.15 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_user_deletion_claimed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='response_headers',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -1,6 +1,10 @@
+import binascii
 import uuid
 import os
-from django.db import models
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from django.contrib.auth.base_user import BaseUserManager
 
 from django.contrib.auth.models import (
@@ -17,6 +21,19 @@ def recipe_image_file_path(instance, filename):
     return os.path.join("upload/recipe", filename)
 
 
+def recipe_image_blob_path(digest, ext):
+    """Generate content-addressed file path for a recipe image"""
+    return os.path.join("upload/recipe", digest[:2], f"{digest}{ext}")
+
+
+def recipe_image_variant_path(filename, variant, digest):
+    """Generate immutable, content-hashed file path for a recipe image variant"""
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    return os.path.join(
+        os.path.dirname(filename), f"{stem}.{variant}.{digest[:16]}{ext}"
+    )
+
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         """Creates and saves a new user"""
@@ -45,6 +62,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Set when the account was deactivated for deletion, see core.deletion
+    deletion_requested = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Last sign of life of the job deleting the account
+    deletion_claimed = models.DateTimeField(null=True, blank=True)
 
     objects = CustomUserManager()
 
@@ -74,6 +95,15 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     """Recipe object"""
 
+    IMAGE_PENDING = "pending"
+    IMAGE_READY = "ready"
+    IMAGE_FAILED = "failed"
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_PENDING, "Pending"),
+        (IMAGE_READY, "Ready"),
+        (IMAGE_FAILED, "Failed"),
+    )
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
@@ -82,6 +112,127 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField("Ingredient")
     tags = models.ManyToManyField("Tag")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_status = models.CharField(max_length=10, blank=True, choices=IMAGE_STATUS_CHOICES)
 
     def __str__(self):
         return self.title
+
+
+class RecipeImageVariant(models.Model):
+    """Resized copy of a recipe image in a given format"""
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="image_variants"
+    )
+    name = models.CharField(max_length=20)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    image = models.ImageField(max_length=255)
+
+    class Meta:
+        unique_together = ("recipe", "name", "format")
+
+    def __str__(self):
+        return f"{self.recipe} {self.name} {self.format}"
+
+
+class ImageBlob(models.Model):
+    """Unique recipe image file shared by every recipe showing it"""
+
+    name = models.CharField(max_length=255, unique=True)
+    source_digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+def generate_token_key():
+    return binascii.hexlify(os.urandom(20)).decode()
+
+
+class AuthTokenManager(models.Manager):
+    def issue(self, user, device=""):
+        """Create a new token for a user's device, replacing the previous one
+
+        Only the AUTH_TOKEN_MAX_PER_USER most recently used tokens of a user
+        are kept.
+        """
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                self.filter(user=user, device=device).delete()
+                token = self.create(
+                    user=user,
+                    device=device,
+                    last_used=now,
+                    expires=now + timedelta(seconds=settings.AUTH_TOKEN_TTL),
+                )
+        except IntegrityError:
+            # A concurrent login from the same device won
+            return self.get(user=user, device=device)
+        keys = self.filter(user=user).order_by("-last_used").values_list("key", flat=True)
+        stale = list(keys[settings.AUTH_TOKEN_MAX_PER_USER:])
+        if stale:
+            self.filter(key__in=stale).delete()
+        return token
+
+
+class AuthToken(models.Model):
+    """Expiring API token of a user on one device"""
+
+    key = models.CharField(max_length=40, primary_key=True, default=generate_token_key)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="auth_tokens"
+    )
+    device = models.CharField(max_length=100, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(default=timezone.now)
+    expires = models.DateTimeField(db_index=True)
+
+    objects = AuthTokenManager()
+
+    class Meta:
+        unique_together = ("user", "device")
+
+    def __str__(self):
+        return self.key
+
+    def touch(self, now=None):
+        """Slide the expiry forward, writing at most once per touch interval"""
+        now = now or timezone.now()
+        if (now - self.last_used).total_seconds() < settings.AUTH_TOKEN_TOUCH_INTERVAL:
+            return False
+        self.last_used = now
+        self.expires = now + timedelta(seconds=settings.AUTH_TOKEN_TTL)
+        AuthToken.objects.filter(pk=self.pk).update(
+            last_used=self.last_used, expires=self.expires
+        )
+        return True
+
+
+class IdempotencyKey(models.Model):
+    """First response to a POST sent with an Idempotency-Key header
+
+    A row without a status code marks a request still in progress.
+    """
+
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True
+    )
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True)
+    response_headers = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("scope", "key")
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
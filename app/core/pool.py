@@ -0,0 +1,55 @@
+"""Pools and other state created lazily in each worker process.
+
+Gunicorn forks its workers from a master that may already have imported
+everything. Threads and pool processes do not survive a fork, so these are
+built on first use in the process using them and again in a forked child.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import BrokenExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class PerProcess:
+    """Value built by ``factory`` on first use in the current process"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._value is None or self._pid != os.getpid():
+            with self._lock:
+                if self._value is None or self._pid != os.getpid():
+                    self._value = self.factory()
+                    self._pid = os.getpid()
+        return self._value
+
+    def reset(self, value):
+        """Drop value so that the next get() builds a new one"""
+        with self._lock:
+            if self._value is value:
+                self._value = None
+
+
+class LazyExecutor(PerProcess):
+    """Executor created on first use in the current process
+
+    A pool broken by a child that died, e.g. killed for running out of
+    memory, refuses every job. It is replaced by a new one and the job
+    submitted again.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        executor = self.get()
+        try:
+            return executor.submit(fn, *args, **kwargs)
+        except BrokenExecutor:
+            logger.warning("Replacing broken %s", type(executor).__name__)
+            self.reset(executor)
+            executor.shutdown(wait=False)
+            return self.get().submit(fn, *args, **kwargs)
@@ -0,0 +1,62 @@
+"""Routing of reads to database replicas.
+
+``ReplicaRoutingMiddleware`` marks safe requests to views that set
+``read_from_replica = True``, and ``ReplicaRouter`` sends their reads to
+one of ``DATABASE_REPLICAS``. Everything else, including reads inside a
+transaction, goes to the primary. Once a request writes, the rest of it
+and the client's requests for the next ``REPLICA_PIN_SECONDS`` are pinned
+to the primary so clients always read their own writes.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_state = threading.local()
+
+
+def start_request(use_replica, pinned=False):
+    _state.use_replica = use_replica
+    _state.pinned = pinned
+    _state.wrote = False
+
+
+def end_request():
+    """Reset the routing state, returning whether the request wrote"""
+    wrote = getattr(_state, "wrote", False)
+    start_request(False)
+    return wrote
+
+
+def pin_primary():
+    """Send all further reads of this request to the primary"""
+    _state.pinned = True
+
+
+def reading_from_replica():
+    return getattr(_state, "use_replica", False) and not getattr(_state, "pinned", False)
+
+
+class ReplicaRouter:
+    """Database router sending reads of marked requests to a replica"""
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not reading_from_replica():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,114 @@
+"""Precomputed OpenAPI schema for the swagger docs.
+
+Introspecting every viewset and serializer is expensive, so the schema is
+generated once and kept both in process memory and as a JSON artifact at
+``SCHEMA_PATH`` (written by ``manage.py generate_schema`` or on the first
+request). The artifact records a fingerprint of the URLconf, view and
+serializer sources and is regenerated only when that fingerprint changes.
+"""
+import hashlib
+import importlib
+import json
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from rest_framework.schemas import SchemaGenerator
+from rest_framework_swagger.renderers import OpenAPICodec, OpenAPIRenderer
+
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_KEY = "x-schema-fingerprint"
+SOURCE_MODULES = ("urls", "views", "serializers")
+
+_cache = None
+
+
+def source_files():
+    """Return source files the schema is derived from"""
+    modules = [settings.ROOT_URLCONF]
+    for app_config in apps.get_app_configs():
+        if app_config.path.startswith(settings.BASE_DIR):
+            modules += [f"{app_config.name}.{module}" for module in SOURCE_MODULES]
+    files = []
+    for name in modules:
+        spec = importlib.util.find_spec(name)
+        if spec is not None and spec.origin:
+            files.append(spec.origin)
+    return sorted(set(files))
+
+
+def fingerprint():
+    """Hash the sources and settings the schema depends on"""
+    digest = hashlib.sha256()
+    digest.update(repr(sorted(settings.SWAGGER_SETTINGS.items())).encode())
+    digest.update(settings.SCHEMA_TITLE.encode())
+    for path in source_files():
+        digest.update(path.encode())
+        with open(path, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def generate(current_fingerprint):
+    """Introspect the API and return the OpenAPI spec as bytes"""
+    generator = SchemaGenerator(title=settings.SCHEMA_TITLE)
+    document = generator.get_schema(request=None, public=True)
+    options = OpenAPIRenderer().get_customizations()
+    options[FINGERPRINT_KEY] = current_fingerprint
+    return OpenAPICodec().encode(document, **options)
+
+
+def read_artifact(path, current_fingerprint):
+    try:
+        with open(path, "rb") as artifact:
+            spec = artifact.read()
+    except OSError:
+        return None
+    try:
+        stored = json.loads(spec.decode()).get(FINGERPRINT_KEY)
+    except ValueError:
+        return None
+    return spec if stored == current_fingerprint else None
+
+
+def write_artifact(path, spec):
+    """Atomically replace the artifact, so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as artifact:
+        artifact.write(spec)
+    os.replace(tmp_path, path)
+
+
+def build(force=False):
+    """Load the schema artifact, regenerating it when out of date
+
+    Returns the spec bytes and whether it was regenerated.
+    """
+    current_fingerprint = fingerprint()
+    spec = None if force else read_artifact(settings.SCHEMA_PATH, current_fingerprint)
+    if spec is not None:
+        return spec, False
+    spec = generate(current_fingerprint)
+    try:
+        write_artifact(settings.SCHEMA_PATH, spec)
+    except OSError:
+        logger.warning("Could not write schema artifact to %s", settings.SCHEMA_PATH)
+    return spec, True
+
+
+def get_spec():
+    """Return the (spec, etag) pair, computed once per process"""
+    global _cache
+    if _cache is None:
+        spec, _ = build()
+        _cache = (spec, '"{}"'.format(hashlib.sha256(spec).hexdigest()[:32]))
+    return _cache
+
+
+def clear_cache():
+    global _cache
+    _cache = None
@@ -0,0 +1,190 @@
+"""Full-text search over recipes.
+
+On PostgreSQL every recipe carries a ``search_vector`` tsvector column with
+a GIN index, built from the recipe title (weight A), tag names (weight B)
+and ingredient names (weight C). On SQLite, which is used for quick local
+test runs, an FTS5 virtual table ``core_recipe_fts`` keyed by the recipe id
+plays the same role. Documents are kept up to date incrementally by the
+signal handlers in ``core.signals``.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connection
+from django.db.models import BooleanField, Func
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = "core_recipe_fts"
+
+TAG_NAMES_SQL = (
+    "SELECT {agg} FROM core_tag t "
+    "INNER JOIN core_recipe_tags rt ON rt.tag_id = t.id "
+    "WHERE rt.recipe_id = r.id"
+)
+INGREDIENT_NAMES_SQL = (
+    "SELECT {agg} FROM core_ingredient i "
+    "INNER JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id "
+    "WHERE ri.recipe_id = r.id"
+)
+
+POSTGRES_DOCUMENT_SQL = (
+    "setweight(to_tsvector('english', r.title), 'A') || "
+    "setweight(to_tsvector('english', coalesce(({tags}), '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(({ingredients}), '')), 'C')"
+).format(
+    tags=TAG_NAMES_SQL.format(agg="string_agg(t.name, ' ')"),
+    ingredients=INGREDIENT_NAMES_SQL.format(agg="string_agg(i.name, ' ')"),
+)
+
+# bm25() column weights for title, tags and ingredients
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def _vendor(conn=None):
+    return (conn or connection).vendor
+
+
+def create_index(conn=None):
+    """Create the search column/table and its index"""
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        if _vendor(conn) == "postgresql":
+            cursor.execute(
+                "ALTER TABLE core_recipe ADD COLUMN IF NOT EXISTS search_vector tsvector"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS core_recipe_search_vector_gin "
+                "ON core_recipe USING gin (search_vector)"
+            )
+        elif _vendor(conn) == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                "USING fts5(title, tags, ingredients)"
+            )
+
+
+def drop_index(conn=None):
+    """Drop the search column/table"""
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        if _vendor(conn) == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS core_recipe_search_vector_gin")
+            cursor.execute("ALTER TABLE core_recipe DROP COLUMN IF EXISTS search_vector")
+        elif _vendor(conn) == "sqlite":
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def update_documents(recipe_ids=None, conn=None):
+    """Rebuild search documents for the given recipes, or for all of them"""
+    conn = conn or connection
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    with conn.cursor() as cursor:
+        if _vendor(conn) == "postgresql":
+            sql = f"UPDATE core_recipe r SET search_vector = {POSTGRES_DOCUMENT_SQL}"
+            if recipe_ids is None:
+                cursor.execute(sql)
+            else:
+                cursor.execute(sql + " WHERE r.id = ANY(%s)", [recipe_ids])
+        elif _vendor(conn) == "sqlite":
+            insert_sql = (
+                f"INSERT INTO {FTS_TABLE} (rowid, title, tags, ingredients) "
+                "SELECT r.id, r.title, ({tags}), ({ingredients}) FROM core_recipe r"
+            ).format(
+                tags=TAG_NAMES_SQL.format(agg="group_concat(t.name, ' ')"),
+                ingredients=INGREDIENT_NAMES_SQL.format(agg="group_concat(i.name, ' ')"),
+            )
+            if recipe_ids is None:
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+                cursor.execute(insert_sql)
+            else:
+                placeholders = ", ".join(["%s"] * len(recipe_ids))
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                    recipe_ids,
+                )
+                cursor.execute(
+                    insert_sql + f" WHERE r.id IN ({placeholders})", recipe_ids
+                )
+
+
+def delete_documents(recipe_ids, conn=None):
+    """Remove search documents of deleted recipes"""
+    conn = conn or connection
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or _vendor(conn) != "sqlite":
+        # On PostgreSQL the document is deleted along with the recipe row
+        return
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", recipe_ids
+        )
+
+
+def fts5_query(text):
+    """Turn free user input into an FTS5 query matching every word as a prefix"""
+    words = re.findall(r"\w+", text)
+    return " ".join('"{}"*'.format(word) for word in words)
+
+
+def tsquery(text):
+    """Turn free user input into a to_tsquery() query matching every word as a prefix"""
+    words = re.findall(r"\w+", text)
+    return " & ".join("{}:*".format(word) for word in words)
+
+
+class PrefixSearchQuery(SearchQuery):
+    """SearchQuery parsed by to_tsquery() instead of plainto_tsquery(), see tsquery()"""
+
+    def as_sql(self, compiler, connection):
+        sql, params = super().as_sql(compiler, connection)
+        return sql.replace("plainto_tsquery(", "to_tsquery(", 1), params
+
+
+class Matches(Func):
+    """tsvector @@ tsquery"""
+
+    template = "(%(expressions)s)"
+    arg_joiner = " @@ "
+    output_field = BooleanField()
+
+
+def _postgres_search(queryset, text):
+    match = tsquery(text)
+    if not match:
+        return queryset.none()
+    query = PrefixSearchQuery(match, config="english")
+    # The column is maintained by this module and not a model field
+    document = RawSQL("core_recipe.search_vector", [], output_field=SearchVectorField())
+    queryset = queryset.annotate(
+        search_match=Matches(document, query), search_rank=SearchRank(document, query)
+    )
+    return queryset.filter(search_match=True).order_by("-search_rank", "-id")
+
+
+def search(queryset, text):
+    """Filter a recipe queryset by full-text query and order it by rank
+
+    Every word of the query must match, as a prefix, on all backends.
+    """
+    vendor = _vendor()
+    if vendor == "postgresql":
+        return _postgres_search(queryset, text)
+    if vendor == "sqlite":
+        match = fts5_query(text)
+        if not match:
+            return queryset.none()
+        weights = ", ".join(str(weight) for weight in SQLITE_WEIGHTS)
+        queryset = queryset.extra(
+            select={"search_rank": f"bm25({FTS_TABLE}, {weights})"},
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = core_recipe.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+        )
+        # bm25() scores are negative, the best match has the lowest value
+        return queryset.order_by("search_rank", "-id")
+    return queryset.filter(title__icontains=text)
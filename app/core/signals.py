@@ -0,0 +1,57 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import search
+from core.models import Ingredient, Recipe, Tag
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    """Refresh the search document of a created or updated recipe"""
+    search.update_documents([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Drop the search document of a deleted recipe"""
+    search.delete_documents([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh search documents when tags or ingredients are (un)assigned"""
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            search.update_documents([instance.pk])
+        return
+    if action == "pre_clear":
+        instance._search_recipe_ids = list(
+            instance.recipe_set.values_list("id", flat=True)
+        )
+    elif action in ("post_add", "post_remove"):
+        search.update_documents(pk_set)
+    elif action == "post_clear":
+        search.update_documents(getattr(instance, "_search_recipe_ids", []))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, **kwargs):
+    """Refresh search documents of recipes using a renamed tag or ingredient"""
+    if not created:
+        search.update_documents(instance.recipe_set.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, **kwargs):
+    """Remember recipes of a tag or ingredient that is being deleted"""
+    instance._search_recipe_ids = list(instance.recipe_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, **kwargs):
+    """Refresh search documents of recipes that lost a tag or ingredient"""
+    search.update_documents(getattr(instance, "_search_recipe_ids", []))
@@ -0,0 +1,45 @@
+import gzip
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Static files storage writing hashed names plus .gz and .br copies
+
+    The copies are written once at collectstatic time, using a thread pool,
+    so nginx can serve them with gzip_static instead of compressing on
+    every request.
+    """
+
+    compress_extensions = (".css", ".js", ".map", ".svg", ".json", ".txt", ".html", ".xml")
+    compress_min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Originals and the final hashed names, not intermediate passes
+        names = set(paths) | set(self.hashed_files.values())
+        names = [name for name in names if name.endswith(self.compress_extensions)]
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(self.compress, names))
+
+    def compress(self, name):
+        """Write compressed copies of a collected file when they are smaller"""
+        path = self.path(name)
+        with open(path, "rb") as f:
+            content = f.read()
+        if len(content) < self.compress_min_size:
+            return
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=9, mtime=0) as gz:
+            gz.write(content)
+        compressed = [(".gz", buffer.getvalue()), (".br", brotli.compress(content))]
+        for ext, data in compressed:
+            if len(data) < len(content):
+                with open(path + ext, "wb") as f:
+                    f.write(data)
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import exceptions
+
+from core.authentication import ExpiringTokenAuthentication
+from core.models import AuthToken
+
+
+class ExpiringTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email="test@test.com", password="testpass"
+        )
+        self.auth = ExpiringTokenAuthentication()
+
+    def test_valid_token(self):
+        """Test a fresh token authenticates its user"""
+        token = AuthToken.objects.issue(self.user)
+
+        user, auth = self.auth.authenticate_credentials(token.key)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(auth, token)
+
+    def test_expired_token_rejected(self):
+        """Test a token past its expiry is refused"""
+        token = AuthToken.objects.issue(self.user)
+        AuthToken.objects.filter(pk=token.pk).update(expires=timezone.now())
+
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, "expired"):
+            self.auth.authenticate_credentials(token.key)
+
+    def test_inactive_user_rejected(self):
+        """Test tokens of deactivated users are refused"""
+        token = AuthToken.objects.issue(self.user)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(token.key)
+
+    @override_settings(AUTH_TOKEN_TTL=3600, AUTH_TOKEN_TOUCH_INTERVAL=300)
+    def test_use_slides_expiry(self):
+        """Test using a token extends it, writing at most once per interval"""
+        token = AuthToken.objects.issue(self.user)
+        issued = token.last_used
+
+        self.assertFalse(token.touch(issued + timedelta(seconds=60)))
+        self.assertTrue(token.touch(issued + timedelta(seconds=600)))
+
+        token.refresh_from_db()
+        self.assertEqual(token.expires, issued + timedelta(seconds=600 + 3600))
@@ -0,0 +1,102 @@
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+from django.db import connections
+from django.test import SimpleTestCase
+
+from core.backends.postgresql import base
+
+
+def raw_connection():
+    """Return a fake psycopg2 connection that is open and idle"""
+    connection = MagicMock(closed=0)
+    connection.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    return connection
+
+
+def connect_with(*raw_connections):
+    """Return a get_new_connection replacement handing out the given connections"""
+    raw_connections = iter(raw_connections)
+
+    def get_new_connection(wrapper, conn_params):
+        wrapper.isolation_level = None
+        return next(raw_connections)
+
+    return get_new_connection
+
+
+@patch("django.db.backends.postgresql.base.DatabaseWrapper.init_connection_state")
+@patch("django.db.backends.postgresql.base.DatabaseWrapper.get_new_connection", autospec=True)
+class ConnectionLifecycleTests(SimpleTestCase):
+    """Test health checks, recycling and pooling of database connections"""
+
+    def setUp(self):
+        base._reset_after_fork()
+        self.addCleanup(base._reset_after_fork)
+
+    def wrapper(self, **options):
+        connections.databases["lifecycle"] = dict(
+            connections["default"].settings_dict, ENGINE="core.backends.postgresql", **options
+        )
+        self.addCleanup(connections.databases.pop, "lifecycle")
+        self.addCleanup(connections.__delitem__, "lifecycle")
+        return connections["lifecycle"]
+
+    def request(self, conn):
+        conn.close_if_unusable_or_obsolete()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.close_if_unusable_or_obsolete()
+
+    def test_persistent_connection_reused(self, get_new_connection, _):
+        """Test one connection serves many requests"""
+        get_new_connection.side_effect = connect_with(raw_connection())
+        conn = self.wrapper(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+
+        for _ in range(3):
+            self.request(conn)
+
+        self.assertEqual(get_new_connection.call_count, 1)
+        self.assertEqual(base.connection_metrics()["health_checks"], 2)
+
+    def test_broken_connection_replaced_before_use(self, get_new_connection, _):
+        """Test a connection failing its health check is replaced"""
+        broken, fresh = raw_connection(), raw_connection()
+        get_new_connection.side_effect = connect_with(broken, fresh)
+        conn = self.wrapper(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+        self.request(conn)
+        broken.cursor.return_value.execute.side_effect = psycopg2.OperationalError
+
+        self.request(conn)
+
+        self.assertIs(conn.connection, fresh)
+        broken.close.assert_called_once_with()
+        self.assertEqual(base.connection_metrics()["health_check_failures"], 1)
+
+    def test_connection_recycled_after_error(self, get_new_connection, _):
+        """Test a connection that raised and stopped answering is closed"""
+        broken = raw_connection()
+        get_new_connection.side_effect = connect_with(broken)
+        conn = self.wrapper(CONN_MAX_AGE=600, POOL_SIZE=2)
+        self.request(conn)
+        conn.errors_occurred = True
+        broken.cursor.return_value.execute.side_effect = psycopg2.OperationalError
+
+        conn.close_if_unusable_or_obsolete()
+
+        self.assertIsNone(conn.connection)
+        broken.close.assert_called_once_with()
+        self.assertEqual(base.connection_metrics()["recycled"], 1)
+
+    def test_pool_reuses_connections(self, get_new_connection, _):
+        """Test closed connections go back to the pool for the next request"""
+        get_new_connection.side_effect = connect_with(*(raw_connection() for _ in range(3)))
+        conn = self.wrapper(CONN_MAX_AGE=0, POOL_SIZE=2)
+
+        for _ in range(3):
+            self.request(conn)
+
+        self.assertEqual(get_new_connection.call_count, 1)
+        metrics = base.connection_metrics()
+        self.assertEqual(metrics["pool_hits"], 2)
+        self.assertEqual(metrics["pool_returns"], 3)
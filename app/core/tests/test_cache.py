@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import LRUCache
+
+
+@override_settings(TEST_CACHE_SIZE=2, TEST_CACHE_TTL=60)
+class LRUCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LRUCache("TEST_CACHE_SIZE", 10, "TEST_CACHE_TTL", 10)
+        self.builds = []
+
+    def build(self, key):
+        self.builds.append(key)
+        return key.upper()
+
+    def get(self, key):
+        return self.cache.get_or_build(key, lambda: self.build(key))
+
+    def test_value_built_once(self):
+        """Test cached values are returned without building them again"""
+        self.assertEqual(self.get("a"), "A")
+        self.assertEqual(self.get("a"), "A")
+
+        self.assertEqual(self.builds, ["a"])
+
+    def test_least_recently_used_evicted(self):
+        """Test only the most recently used values are kept"""
+        for key in ("a", "b", "a", "c"):
+            self.get(key)
+
+        self.assertEqual(list(self.cache), ["a", "c"])
+
+    def test_expired_value_rebuilt(self):
+        """Test values older than the TTL are built again"""
+        self.get("a")
+        with patch("core.cache.time.monotonic", return_value=10 ** 9):
+            self.get("a")
+
+        self.assertEqual(self.builds, ["a", "a"])
+
+    def test_pop(self):
+        """Test a popped value is built again"""
+        self.get("a")
+        self.cache.pop("a")
+        self.cache.pop("missing")
+        self.get("a")
+
+        self.assertEqual(self.builds, ["a", "a"])
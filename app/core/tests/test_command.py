@@ -1,8 +1,19 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import blobs
+from core.models import AuthToken, IdempotencyKey, ImageBlob, Recipe
 
 
 class CommandTests(TestCase):
@@ -11,14 +22,194 @@ class CommandTests(TestCase):
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is available"""
         with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
-            gi.return_value = True
-            call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 1)
+            call_command("wait_for_db", stdout=StringIO())
+            self.assertEqual(gi.return_value.ensure_connection.call_count, 1)
+            gi.return_value.cursor.return_value.__enter__.return_value.execute.assert_called_once_with(
+                "SELECT 1"
+            )
 
     @patch("time.sleep", return_value=True)
     def test_wait_for_db(self, ts):
         """Test waiting for db"""
         with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]  # type: ignore
-            call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 6)
+            gi.return_value.ensure_connection.side_effect = [OperationalError] * 5 + [None]  # type: ignore
+            call_command("wait_for_db", stdout=StringIO())
+            self.assertEqual(gi.return_value.ensure_connection.call_count, 6)
+
+        delays = [call[0][0] for call in ts.call_args_list]
+        self.assertEqual(len(delays), 5)
+        self.assertLess(delays[0], delays[-1])
+
+    @patch("time.sleep", return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Test giving up when the database stays unavailable"""
+        with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
+            gi.return_value.ensure_connection.side_effect = OperationalError  # type: ignore
+            with patch("time.monotonic", side_effect=range(100)):
+                with self.assertRaises(CommandError):
+                    call_command("wait_for_db", "--timeout", "10", stdout=StringIO())
+
+    @patch("time.sleep", return_value=True)
+    def test_wait_for_migrations(self, ts):
+        """Test waiting until migrations are applied"""
+        with patch("django.db.migrations.executor.MigrationExecutor.migration_plan") as plan:
+            plan.side_effect = [["0001_initial"], []]  # type: ignore
+            call_command("wait_for_db", "--wait-for-migrations", stdout=StringIO())
+
+        self.assertEqual(plan.call_count, 2)
+        self.assertEqual(ts.call_count, 1)
+
+
+class PurgeTokensCommandTests(TestCase):
+    def test_purge_tokens(self):
+        """Test only expired tokens are deleted, in batches"""
+        now = timezone.now()
+        user = get_user_model().objects.create_user(  # type: ignore
+            email="test@test.com", password="testpass"
+        )
+        for device in range(5):
+            AuthToken.objects.create(
+                user=user, device=str(device), expires=now - timedelta(days=1)
+            )
+        valid = AuthToken.objects.create(user=user, expires=now + timedelta(days=1))
+
+        out = StringIO()
+        call_command("purge_tokens", "--batch-size=2", stdout=out)
+
+        self.assertIn("Deleted 5 expired tokens", out.getvalue())
+        self.assertEqual(list(AuthToken.objects.all()), [valid])
+
+    def test_purge_idempotency_keys(self):
+        """Test expired idempotency keys are deleted"""
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            scope="anonymous", key="old", fingerprint="x", expires=now - timedelta(days=1)
+        )
+        IdempotencyKey.objects.create(
+            scope="anonymous", key="new", fingerprint="x", expires=now + timedelta(days=1)
+        )
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+
+        self.assertIn("Deleted 1 expired idempotency keys", out.getvalue())
+        self.assertEqual(IdempotencyKey.objects.get().key, "new")
+
+
+class GcMediaCommandTests(TestCase):
+    """Test removing orphaned media files"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        user = get_user_model().objects.create_user("test@test.com", "password")  # type: ignore
+        self.recipe = Recipe.objects.create(
+            user=user, title="Sample", time_minutes=5, price=5.00, image="upload/recipe/kept.jpg"
+        )
+        for name in ("upload/recipe/kept.jpg", "upload/recipe/ab/orphan.jpg"):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"image")
+
+    def path(self, name):
+        return os.path.join(self.media_root, name)
+
+    def call(self, *args):
+        out = StringIO()
+        with override_settings(MEDIA_ROOT=self.media_root):
+            call_command("gc_media", "--min-age=0", *args, stdout=out)
+        return out.getvalue()
+
+    def test_gc_media_deletes_orphans(self):
+        """Test unreferenced files are deleted and referenced ones kept"""
+        out = self.call()
+
+        self.assertTrue(os.path.exists(self.path("upload/recipe/kept.jpg")))
+        self.assertFalse(os.path.exists(self.path("upload/recipe/ab/orphan.jpg")))
+        self.assertIn("Deleted 1 orphaned files", out)
+
+    def test_gc_media_dry_run(self):
+        """Test dry run only reports orphans"""
+        out = self.call("--dry-run")
+
+        self.assertTrue(os.path.exists(self.path("upload/recipe/ab/orphan.jpg")))
+        self.assertIn("Found 1 orphaned files (5 bytes) out of 2 scanned", out)
+
+    def test_gc_media_quarantine(self):
+        """Test orphans can be moved aside instead of deleted"""
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine)
+
+        self.call("--quarantine", quarantine)
+
+        self.assertFalse(os.path.exists(self.path("upload/recipe/ab/orphan.jpg")))
+        self.assertTrue(
+            os.path.exists(os.path.join(quarantine, "upload/recipe/ab/orphan.jpg"))
+        )
+
+    def write(self, name):
+        with open(self.path(name), "wb") as f:
+            f.write(b"image")
+
+    def test_gc_media_keeps_file_stored_again(self):
+        """Test an orphan reused by an upload right after the check is kept"""
+        digest = "ab" * 32
+        name = f"upload/recipe/ab/{digest}.jpg"
+        self.write(name)
+        self.write(f"upload/recipe/ab/{digest}.thumb.{digest[:16]}.webp")
+        referenced_names = blobs.referenced_names
+
+        def upload_after_check(names):
+            found = referenced_names(names)
+            # What store() does when it finds the file already there
+            ImageBlob.objects.get_or_create(name=name, defaults={"size": 5, "ref_count": 1})
+            return found
+
+        with patch("core.blobs.referenced_names", side_effect=upload_after_check):
+            out = self.call()
+
+        self.assertTrue(os.path.exists(self.path(name)))
+        self.assertTrue(
+            os.path.exists(self.path(f"upload/recipe/ab/{digest}.thumb.{digest[:16]}.webp"))
+        )
+        self.assertIn("Deleted 1 orphaned files", out)
+
+    def test_gc_media_deletes_orphan_blob_and_variants(self):
+        """Test unreferenced blobs and their variants go, leaving no blob rows"""
+        digest = "cd" * 32
+        os.makedirs(self.path("upload/recipe/cd"))
+        self.write(f"upload/recipe/cd/{digest}.jpg")
+        self.write(f"upload/recipe/cd/{digest}.thumb.{digest[:16]}.webp")
+
+        out = self.call()
+
+        self.assertEqual(os.listdir(self.path("upload/recipe/cd")), [])
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertIn("Deleted 3 orphaned files", out)
+
+
+class StartupProfileCommandTests(TestCase):
+    """Test profiling imports of the WSGI application"""
+
+    def test_reports_import_times(self):
+        """Test the slowest imports and the total are listed"""
+        out = StringIO()
+
+        call_command("startup_profile", "--limit", "5", stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertIn("Imported", lines[-1])
+
+    def test_api_only_profile(self):
+        """Test API-only workers import neither the admin, swagger nor NumPy"""
+        out = StringIO()
+
+        with patch.dict(os.environ, {"API_ONLY": "1"}):
+            call_command("startup_profile", "--with-urls", "--limit", "10000", stdout=out)
+
+        modules = {line.split()[-1] for line in out.getvalue().splitlines()[1:-1]}
+        self.assertIn("recipe.views", modules)
+        for module in ("core.admin", "rest_framework_swagger", "numpy"):
+            self.assertNotIn(module, modules)
@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import blobs, deletion
+from core.models import AuthToken, ImageBlob, Ingredient, Recipe, Tag
+
+ME_URL = reverse("user:me")
+
+
+def create_user(email):
+    return get_user_model().objects.create_user(email=email, password="testpass")  # type: ignore
+
+
+def sample_account(user, recipes=3):
+    """Give a user recipes with tags and ingredients"""
+    tag = Tag.objects.create(user=user, name="Vegan")
+    ingredient = Ingredient.objects.create(user=user, name="Salt")
+    for index in range(recipes):
+        recipe = Recipe.objects.create(
+            user=user, title=f"Recipe {index}", time_minutes=10, price=5.00
+        )
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+
+@override_settings(USER_DELETION_WORKERS=0)
+class UserDeletionTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        storage = blobs.get_storage()
+        self.storage_patch = patch.object(storage, "location", self.media_root)
+        self.storage_patch.start()
+        self.user = create_user("test@test.com")
+        self.other = create_user("other@test.com")
+        sample_account(self.user)
+        sample_account(self.other)
+
+    def schedule(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False, deletion_requested=timezone.now()
+        )
+
+    def tearDown(self):
+        self.storage_patch.stop()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_delete_user_in_batches(self):
+        """Test all data of the user goes, in batches, and nobody else's"""
+        seen = []
+        self.schedule()
+
+        totals = deletion.delete_user(
+            self.user.pk, batch_size=2, progress=lambda label, count: seen.append((label, count))
+        )
+
+        self.assertEqual(totals["recipes"], 3)
+        self.assertIn(("recipes", 2), seen)
+        self.assertFalse(get_user_model().objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+        self.assertFalse(Recipe.tags.through.objects.exclude(recipe__user=self.other).exists())
+        self.assertTrue(Ingredient.objects.filter(user=self.other).exists())
+
+    def test_delete_user_releases_images(self):
+        """Test the image files of deleted recipes are removed"""
+        fd, path = tempfile.mkstemp(suffix=".jpg")
+        os.write(fd, b"image")
+        os.close(fd)
+        name = blobs.store(path, "ab" * 32, "cd" * 32)
+        os.remove(path)
+        Recipe.objects.filter(user=self.user).update(image=name)
+        ImageBlob.objects.update(ref_count=3)
+        self.schedule()
+
+        deletion.delete_user(self.user.pk)
+
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(blobs.get_storage().exists(name))
+
+    def test_delete_me_deactivates_and_deletes(self):
+        """Test DELETE on the profile revokes tokens and deletes the account"""
+        token = AuthToken.objects.issue(self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        with patch("core.deletion.delete_user") as delete_user:
+            res = client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deletion_requested)
+        self.assertFalse(AuthToken.objects.filter(user=self.user).exists())
+        delete_user.assert_called_once_with(self.user.pk)
+
+    def test_delete_users_command_resumes(self):
+        """Test the command finishes deletions interrupted by a restart"""
+        with patch("core.deletion.delete_user"):
+            deletion.request_deletion(self.user)
+
+        out = StringIO()
+        call_command("delete_users", stdout=out)
+
+        self.assertIn(f"Deleted user {self.user.pk}", out.getvalue())
+        self.assertEqual(list(get_user_model().objects.all()), [self.other])
+
+    def test_active_user_not_deleted(self):
+        """Test only users scheduled for deletion are deleted"""
+        self.assertIsNone(deletion.delete_user(self.user.pk))
+
+        self.assertTrue(Recipe.objects.filter(user=self.user).exists())
+
+    def test_deletion_claimed_once(self):
+        """Test a user being deleted by one job is skipped by others"""
+        self.schedule()
+        self.assertTrue(deletion.claim(self.user.pk))
+
+        out = StringIO()
+        call_command("delete_users", stdout=out)
+
+        self.assertIn("skipped", out.getvalue())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+
+    def test_stale_claim_taken_over(self):
+        """Test the deletion of a job that died is picked up again"""
+        self.schedule()
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            deletion_claimed=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertIsNotNone(deletion.delete_user(self.user.pk))
+
+    @override_settings(USER_DELETION_WORKERS=1)
+    def test_job_starts_after_commit(self):
+        """Test the background job is only submitted once the deactivation commits"""
+        with patch("core.deletion._executor") as executor, patch(
+            "core.deletion.transaction.on_commit"
+        ) as on_commit:
+            deletion.request_deletion(self.user)
+            executor.submit.assert_not_called()
+
+            on_commit.call_args[0][0]()
+
+        executor.submit.assert_called_once_with(deletion._run, self.user.pk)
@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from core.models import IdempotencyKey, Tag
+from recipe.views import TagViewSet
+
+TAGS_URL = reverse("recipe:tag-list")
+CREATE_USER_URL = reverse("user:create")
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email="test@test.com", password="testpass"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_tag(self, name, key="retry-1"):
+        return self.client.post(TAGS_URL, {"name": name}, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        """Test a retried POST returns the stored response without a second write"""
+        first = self.post_tag("Vegan")
+        with self.assertNumQueries(1):
+            retry = self.post_tag("Vegan")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)  # type: ignore
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        """Test the same key of another user is a new request"""
+        self.post_tag("Vegan")
+        other = get_user_model().objects.create_user(  # type: ignore
+            email="other@test.com", password="testpass"
+        )
+        self.client.force_authenticate(other)
+
+        res = self.post_tag("Vegan")
+
+        self.assertNotIn("Idempotent-Replayed", res)
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_key_reused_for_other_request(self):
+        """Test a key sent with a different body is refused"""
+        self.post_tag("Vegan")
+
+        res = self.post_tag("Dessert")
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_request_in_progress(self):
+        """Test a duplicate of an unfinished request is told to retry"""
+        self.post_tag("Vegan")
+        IdempotencyKey.objects.update(status_code=None)
+
+        res = self.post_tag("Vegan")
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn("Retry-After", res)
+
+    def test_expired_key_runs_again(self):
+        """Test a key past its TTL is claimed by the new request"""
+        self.post_tag("Vegan")
+        IdempotencyKey.objects.update(expires=timezone.now() - timedelta(seconds=1))
+
+        res = self.post_tag("Vegan")
+
+        self.assertNotIn("Idempotent-Replayed", res)
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_invalid_request_not_stored(self):
+        """Test a failed request leaves the key free for a corrected retry"""
+        res = self.post_tag("")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_create_user_replayed(self):
+        """Test a retried sign up does not create a second user"""
+        client = APIClient()
+        payload = {"email": "new@test.com", "password": "testpass", "name": "New"}
+
+        first = client.post(CREATE_USER_URL, payload, HTTP_IDEMPOTENCY_KEY="signup")
+        retry = client.post(CREATE_USER_URL, payload, HTTP_IDEMPOTENCY_KEY="signup")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertNotIn("password", retry.data)  # type: ignore
+
+    def test_anonymous_keys_are_per_address(self):
+        """Test anonymous clients at other addresses do not share keys"""
+        client = APIClient()
+        first = client.post(
+            CREATE_USER_URL,
+            {"email": "one@test.com", "password": "testpass", "name": "One"},
+            HTTP_IDEMPOTENCY_KEY="signup",
+            REMOTE_ADDR="10.0.0.1",
+        )
+        other = client.post(
+            CREATE_USER_URL,
+            {"email": "two@test.com", "password": "testpass", "name": "Two"},
+            HTTP_IDEMPOTENCY_KEY="signup",
+            REMOTE_ADDR="10.0.0.2",
+        )
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", other)
+        self.assertEqual(other.data["email"], "two@test.com")  # type: ignore
+
+    def test_replay_restores_location(self):
+        """Test headers such as Location are replayed with the stored body"""
+
+        class LocationTagViewSet(TagViewSet):
+            def get_success_headers(self, data):
+                return {"Location": f"/recipe/tags/{data['id']}/"}
+
+        view = LocationTagViewSet.as_view({"post": "create"})
+        factory = APIRequestFactory()
+
+        def post():
+            request = factory.post(TAGS_URL, {"name": "Vegan"}, HTTP_IDEMPOTENCY_KEY="retry-1")
+            force_authenticate(request, self.user)
+            return view(request)
+
+        first = post()
+        retry = post()
+
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry["Location"], first["Location"])
+        self.assertEqual(Tag.objects.count(), 1)
@@ -0,0 +1,173 @@
+import gzip
+
+import brotli
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+
+from core import concurrency
+from core.middleware import (
+    BrowserMiddleware,
+    CompressionMiddleware,
+    ConcurrencyLimitMiddleware,
+    accepted_encodings,
+)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(TestCase):
+    """Test negotiated response compression"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = b'{"title": "Sample recipe"}' * 50
+
+    def process(self, response, accept="gzip, deflate"):
+        request = self.factory.get("/recipe/recipes/", HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_json_gzipped(self):
+        """Test large JSON responses are gzipped for clients accepting it"""
+        response = self.process(HttpResponse(self.body, content_type="application/json"))
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_small_response_not_compressed(self):
+        """Test responses under the size threshold are left alone"""
+        response = self.process(HttpResponse(b"{}", content_type="application/json"))
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, b"{}")
+
+    def test_encoding_not_accepted(self):
+        """Test nothing is compressed when the client refuses every encoding"""
+        response = self.process(
+            HttpResponse(self.body, content_type="application/json"), accept="gzip;q=0"
+        )
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_binary_content_not_compressed(self):
+        """Test already compressed types such as images are skipped"""
+        response = self.process(HttpResponse(self.body, content_type="image/jpeg"))
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_streaming_response_compressed(self):
+        """Test streaming responses are compressed chunk by chunk"""
+        chunks = [self.body[:600], self.body[600:]]
+        response = self.process(
+            StreamingHttpResponse(iter(chunks), content_type="application/json")
+        )
+
+        compressed = list(response.streaming_content)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertGreaterEqual(len(compressed), 2)
+        self.assertEqual(gzip.decompress(b"".join(compressed)), self.body)
+
+    def test_brotli_preferred(self):
+        """Test brotli is chosen over gzip when accepted"""
+        response = self.process(
+            HttpResponse(self.body, content_type="application/json"), accept="gzip, br"
+        )
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertLess(len(response.content), len(self.body))
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    def test_streaming_response_brotli(self):
+        """Test streaming responses are brotli compressed chunk by chunk"""
+        chunks = [self.body[:600], self.body[600:]]
+        response = self.process(
+            StreamingHttpResponse(iter(chunks), content_type="application/json"), accept="br"
+        )
+
+        compressed = list(response.streaming_content)
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertGreaterEqual(len(compressed), 2)
+        self.assertEqual(brotli.decompress(b"".join(compressed)), self.body)
+
+    def test_accepted_encodings(self):
+        """Test parsing q values of Accept-Encoding"""
+        self.assertEqual(
+            accepted_encodings("gzip;q=0.5, br;q=0, identity"), {"gzip", "identity"}
+        )
+
+
+class BrowserMiddlewareTests(TestCase):
+    """Test skipping session, CSRF and message handling on API paths"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+        self.middleware = BrowserMiddleware(self.view)
+
+    def view(self, request):
+        self.seen.append(request)
+        return HttpResponse("ok")
+
+    def test_api_paths_skip_browser_middleware(self):
+        """Test token authenticated paths get no session or user"""
+        self.middleware(self.factory.get("/recipe/recipes/"))
+
+        request = self.seen[0]
+        self.assertFalse(hasattr(request, "session"))
+        self.assertFalse(hasattr(request, "user"))
+        self.assertFalse(hasattr(request, "_messages"))
+
+    def test_admin_keeps_full_stack(self):
+        """Test the admin gets sessions, users and messages"""
+        self.middleware(self.factory.get("/admin/"))
+
+        request = self.seen[0]
+        self.assertTrue(hasattr(request, "session"))
+        self.assertTrue(hasattr(request, "user"))
+        self.assertTrue(hasattr(request, "_messages"))
+
+    def test_admin_csrf_enforced(self):
+        """Test the CSRF check still runs for browser pages"""
+        client = Client(enforce_csrf_checks=True)
+
+        res = client.post("/admin/login/", {"username": "a", "password": "b"})
+
+        self.assertEqual(res.status_code, 403)
+
+
+@override_settings(MAX_IN_FLIGHT_REQUESTS=1, LOAD_SHED_RETRY_AFTER=3)
+class ConcurrencyLimitMiddlewareTests(TestCase):
+    """Test shedding requests beyond the in-flight limit"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ConcurrencyLimitMiddleware(self.view)
+        self.inner = []
+
+    def view(self, request):
+        # A second request arriving while this one is in progress
+        if request.path == "/recipe/recipes/" and not self.inner:
+            self.inner.append(self.middleware(self.factory.get(request.path)))
+            self.inner.append(self.middleware(self.factory.get("/healthz")))
+        return HttpResponse("ok")
+
+    def test_requests_beyond_limit_get_503(self):
+        """Test a request over the limit is turned away with Retry-After"""
+        res = self.middleware(self.factory.get("/recipe/recipes/"))
+
+        self.assertEqual(res.status_code, 200)
+        busy, health = self.inner
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy["Retry-After"], "3")
+        self.assertEqual(health.status_code, 200)
+        self.assertEqual(concurrency.in_flight(), 0)
+
+    def test_exited_worker_released(self):
+        """Test requests left in progress by an exited worker are forgotten"""
+        slot = concurrency.assign_slot()
+        concurrency.use_slot(slot)
+        self.addCleanup(concurrency.use_slot, 0)
+        self.assertTrue(concurrency.acquire(1))
+
+        concurrency.release_slot(slot)
+
+        self.assertEqual(concurrency.in_flight(), 0)
@@ -76,3 +76,13 @@ class ModelTests(TestCase):
 
         exp_path = f"upload/recipe/{uuid}.jpg"
         self.assertEqual(file_path, exp_path)
+
+    def test_recipe_image_variant_file_name(self):
+        """Test that image variants are named after their content hash"""
+
+        file_path = models.recipe_image_variant_path(
+            "upload/recipe/test-uuid.webp", "thumb", "0123456789abcdef0123"
+        )
+
+        exp_path = "upload/recipe/test-uuid.thumb.0123456789abcdef.webp"
+        self.assertEqual(file_path, exp_path)
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.thread import BrokenThreadPool
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core import pool
+
+
+class PerProcessTests(SimpleTestCase):
+    def test_built_once_per_process(self):
+        """Test the value is built on first use and again in a forked child"""
+        built = []
+        value = pool.PerProcess(lambda: built.append(None) or len(built))
+
+        first = value.get()
+        self.assertEqual(value.get(), first)
+        with patch("core.pool.os.getpid", return_value=-1):
+            self.assertNotEqual(value.get(), first)
+
+        self.assertEqual(len(built), 2)
+
+
+class BrokenExecutor:
+    def submit(self, fn, *args):
+        raise BrokenThreadPool("A thread initializer failed")
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+class LazyExecutorTests(SimpleTestCase):
+    def test_broken_executor_replaced(self):
+        """Test a broken executor is shut down and the job run by a new one"""
+        broken = BrokenExecutor()
+        executors = iter([broken, ThreadPoolExecutor(max_workers=1)])
+        executor = pool.LazyExecutor(lambda: next(executors))
+        self.addCleanup(lambda: executor.get().shutdown())
+
+        future = executor.submit(sum, [1, 2])
+
+        self.assertEqual(future.result(timeout=5), 3)
+        self.assertTrue(broken.shut_down)
@@ -0,0 +1,108 @@
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.cache.backends import locmem
+from django.db import router
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe
+
+
+class ReadView:
+    read_from_replica = True
+
+
+class PrimaryView:
+    pass
+
+
+def view_for(view_class):
+    """Return a view function recording the database reads are routed to"""
+
+    def view(request):
+        view.read_db = router.db_for_read(Recipe)
+        if request.method == "POST":
+            router.db_for_write(Recipe)
+            view.after_write_db = router.db_for_read(Recipe)
+        return None
+
+    view.cls = view_class
+    return view
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Test routing reads of safe requests to replicas"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        caches["shared"].clear()
+        self.addCleanup(caches["shared"].clear)
+
+    def process(self, request, view):
+        middleware = ReplicaRoutingMiddleware(lambda request: None)
+        middleware.process_request(request)
+        middleware.process_view(request, view, (), {})
+        view(request)
+        middleware.process_response(request, None)
+
+    def test_safe_request_reads_replica(self):
+        """Test GET requests to marked views read from a replica"""
+        view = view_for(ReadView)
+        self.process(self.factory.get("/recipe/recipes/"), view)
+
+        self.assertEqual(view.read_db, "replica_0")
+
+    def test_unmarked_view_reads_primary(self):
+        """Test views without read_from_replica read from the primary"""
+        view = view_for(PrimaryView)
+        self.process(self.factory.get("/user/token/"), view)
+
+        self.assertEqual(view.read_db, "default")
+
+    def test_write_pins_request_and_client(self):
+        """Test reads after a write, and the client's next requests, use the primary"""
+        view = view_for(ReadView)
+        self.process(self.factory.post("/recipe/recipes/", HTTP_AUTHORIZATION="Token a"), view)
+        self.assertEqual(view.after_write_db, "default")
+
+        self.process(self.factory.get("/recipe/recipes/", HTTP_AUTHORIZATION="Token a"), view)
+        self.assertEqual(view.read_db, "default")
+
+        self.process(self.factory.get("/recipe/recipes/", HTTP_AUTHORIZATION="Token b"), view)
+        self.assertEqual(view.read_db, "replica_0")
+
+    def test_no_replicas_configured(self):
+        """Test everything reads from the primary without replicas"""
+        view = view_for(ReadView)
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.process(self.factory.get("/recipe/recipes/"), view)
+
+        self.assertEqual(view.read_db, "default")
+
+    def test_state_reset_after_request(self):
+        """Test reads outside requests go to the primary"""
+        self.process(self.factory.get("/recipe/recipes/"), view_for(ReadView))
+
+        self.assertEqual(router.db_for_read(Recipe), "default")
+
+    def test_pin_survives_other_worker(self):
+        """Test a client stays pinned when another process serves its next GET"""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": location,
+        }
+        view = view_for(ReadView)
+        default = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        with self.settings(CACHES={"default": default, "shared": shared}):
+            self.process(self.factory.post("/recipe/recipes/", HTTP_AUTHORIZATION="Token a"), view)
+            # Nothing kept in the memory of the process that handled the write
+            for store in (*locmem._caches.values(), *locmem._expire_info.values()):
+                store.clear()
+            self.process(self.factory.get("/recipe/recipes/", HTTP_AUTHORIZATION="Token a"), view)
+
+        self.assertEqual(view.read_db, "default")
@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import schema
+
+
+DOCS_URL = reverse("docs")
+
+
+class SchemaTests(TestCase):
+    """Test the precomputed swagger schema"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, "openapi.json")
+        settings_override = override_settings(SCHEMA_PATH=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema.clear_cache()
+        self.addCleanup(schema.clear_cache)
+        self.client = APIClient()
+
+    def test_openapi_schema_served_with_etag(self):
+        """Test the spec lists the API and carries an ETag"""
+        res = self.client.get(DOCS_URL, {"format": "openapi"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        spec = json.loads(res.content.decode())
+        self.assertIn("/recipe/recipes/", spec["paths"])
+        self.assertTrue(res["ETag"])
+
+    def test_if_none_match_not_modified(self):
+        """Test a matching ETag returns 304 without a body"""
+        etag = self.client.get(DOCS_URL, {"format": "openapi"})["ETag"]
+
+        res = self.client.get(DOCS_URL, {"format": "openapi"}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+
+    def test_if_none_match_compares_whole_tags(self):
+        """Test If-None-Match lists, weak tags and * match, fragments of a tag do not"""
+        etag = self.client.get(DOCS_URL, {"format": "openapi"})["ETag"]
+        cases = {
+            f'"other", {etag}': status.HTTP_304_NOT_MODIFIED,
+            f"W/{etag}": status.HTTP_304_NOT_MODIFIED,
+            "*": status.HTTP_304_NOT_MODIFIED,
+            f'"x{etag[1:]}': status.HTTP_200_OK,
+            etag[1:-1]: status.HTTP_200_OK,
+            f'"{etag}"': status.HTTP_200_OK,
+        }
+
+        for header, expected in cases.items():
+            res = self.client.get(DOCS_URL, {"format": "openapi"}, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(res.status_code, expected, header)
+
+    def test_swagger_ui_embeds_spec(self):
+        """Test the HTML docs page is rendered from the cached spec"""
+        res = self.client.get(DOCS_URL, HTTP_ACCEPT="text/html")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b"/recipe/recipes/", res.content)
+
+    def test_schema_generated_once(self):
+        """Test the schema is built once per process and reused from disk"""
+        with patch("core.schema.generate", wraps=schema.generate) as generate:
+            self.client.get(DOCS_URL, {"format": "openapi"})
+            self.client.get(DOCS_URL, {"format": "openapi"})
+            schema.clear_cache()
+            self.client.get(DOCS_URL, {"format": "openapi"})
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_schema_regenerated_when_sources_change(self):
+        """Test a stale artifact is replaced"""
+        call_command("generate_schema", stdout=StringIO())
+
+        with patch("core.schema.fingerprint", return_value="changed"):
+            spec, regenerated = schema.build()
+
+        self.assertTrue(regenerated)
+        self.assertEqual(json.loads(spec.decode())[schema.FINGERPRINT_KEY], "changed")
+
+    def test_generate_schema_command_up_to_date(self):
+        """Test the command leaves a current artifact alone"""
+        call_command("generate_schema", stdout=StringIO())
+        out = StringIO()
+
+        call_command("generate_schema", stdout=out)
+
+        self.assertIn("up to date", out.getvalue())
@@ -0,0 +1,69 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+import brotli
+from django.test import TestCase
+
+from core.storage import CompressedManifestStaticFilesStorage
+
+
+class CompressedStaticStorageTests(TestCase):
+    """Test precompressing static files at collectstatic time"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = CompressedManifestStaticFilesStorage(location=self.root)
+
+    def write(self, name, content):
+        with open(os.path.join(self.root, name), "wb") as f:
+            f.write(content)
+
+    def post_process(self, *names):
+        paths = {name: (self.storage, name) for name in names}
+        return list(self.storage.post_process(paths))
+
+    def test_collected_files_compressed(self):
+        """Test hashed and original names get a smaller .gz copy"""
+        content = b"body { color: red; }\n" * 100
+        self.write("style.css", content)
+
+        self.post_process("style.css")
+
+        hashed_name = self.storage.stored_name("style.css")
+        self.assertNotEqual(hashed_name, "style.css")
+        for name in ("style.css", hashed_name):
+            with open(os.path.join(self.root, name + ".gz"), "rb") as f:
+                self.assertEqual(gzip.decompress(f.read()), content)
+
+    def test_small_and_binary_files_not_compressed(self):
+        """Test tiny files and non text types are left alone"""
+        self.write("tiny.js", b"var a;")
+        self.write("image.png", b"\x89PNG" * 200)
+
+        self.post_process("tiny.js", "image.png")
+
+        self.assertFalse(os.path.exists(os.path.join(self.root, "tiny.js.gz")))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "image.png.gz")))
+
+    def test_brotli_copies_written(self):
+        """Test collected files get a smaller .br copy next to the .gz one"""
+        content = b"body { color: red; }\n" * 100
+        self.write("style.css", content)
+
+        self.post_process("style.css")
+
+        hashed_name = self.storage.stored_name("style.css")
+        for name in ("style.css", hashed_name):
+            path = os.path.join(self.root, name + ".br")
+            with open(path, "rb") as f:
+                compressed = f.read()
+            self.assertLess(len(compressed), len(content))
+            self.assertEqual(brotli.decompress(compressed), content)
+
+    def test_missing_manifest_entry_rejected(self):
+        """Test files that were not collected are an error, not a plain name"""
+        with self.assertRaises(ValueError):
+            self.storage.stored_name("missing.css")
@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from core.cache import SharedFileCache
+from core.throttling import IPThrottle
+
+TOKEN_URL = reverse("user:token")
+
+
+class ClockedThrottle(IPThrottle):
+    rate = "10/min"
+    now = 0.0
+
+    def timer(self):
+        return self.now
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        caches["shared"].clear()
+        self.request = APIView().initialize_request(RequestFactory().get("/"))
+        self.throttle = ClockedThrottle()
+
+    def hits(self, at, count):
+        ClockedThrottle.now = at
+        return sum(self.throttle.allow_request(self.request, None) for _ in range(count))
+
+    def test_limit_within_window(self):
+        """Test requests beyond the rate are refused"""
+        self.assertEqual(self.hits(0.0, 15), 10)
+
+    def test_previous_window_weighs_in(self):
+        """Test a burst at a window boundary can not double the rate"""
+        self.assertEqual(self.hits(59.0, 10), 10)
+        # A quarter into the next window three quarters of the burst count
+        self.assertEqual(self.hits(75.0, 10), 2)
+        self.assertGreater(self.throttle.wait(), 0)
+        self.assertEqual(self.hits(180.0, 10), 10)
+
+    def test_login_throttled(self):
+        """Test logins are limited per address and answered with Retry-After"""
+        get_user_model().objects.create_user(  # type: ignore
+            email="test@test.com", password="testpass"
+        )
+        client = APIClient()
+        payload = {"email": "test@test.com", "password": "wrong"}
+        statuses = [client.post(TOKEN_URL, payload).status_code for _ in range(11)]
+
+        self.assertEqual(statuses[:10], [400] * 10)
+        self.assertEqual(statuses[10], 429)
+        res = client.post(TOKEN_URL, payload)
+        self.assertIn("Retry-After", res)
+
+
+class SharedFileCacheTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.cache = SharedFileCache(location, {"OPTIONS": {"MAX_ENTRIES": 3}})
+
+    def test_live_entries_never_culled(self):
+        """Test entries beyond MAX_ENTRIES are kept"""
+        for index in range(10):
+            self.cache.set(f"key-{index}", index, 60)
+
+        self.assertEqual(len(self.cache._list_cache_files()), 10)
+
+    def test_sweep_deletes_expired(self):
+        """Test expired entries are removed by the periodic sweep only"""
+        self.cache.set("old", 1, 60)
+        self.cache.set("live", 1, 600)
+        with patch("time.time", return_value=time.time() + 120):
+            self.cache._last_sweep -= 3600
+            self.cache.set("new", 1, 60)
+
+        self.assertEqual(len(self.cache._list_cache_files()), 2)
@@ -0,0 +1,31 @@
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+
+class HealthCheckTests(TestCase):
+    """Test the liveness and readiness probes"""
+
+    def test_healthz(self):
+        """Test the liveness probe answers without the database"""
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse("healthz"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_readyz(self):
+        """Test the readiness probe queries the database"""
+        res = self.client.get(reverse("readyz"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.json()["database"])
+
+    def test_readyz_database_down(self):
+        """Test the readiness probe fails while the database is unavailable"""
+        with patch("django.db.backends.utils.CursorWrapper.execute", side_effect=OperationalError):
+            res = self.client.get(reverse("readyz"))
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
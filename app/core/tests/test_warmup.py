@@ -0,0 +1,24 @@
+from django.test import TestCase
+
+from core import warmup
+from recipe.serializers import RecipeSerializer
+
+
+class WarmupTests(TestCase):
+    """Test priming caches before serving requests"""
+
+    def test_serializers_of_routed_views_primed(self):
+        """Test the serializers of every routed view are built"""
+        resolver = warmup.prime_resolvers()
+        view_classes = set(warmup.iter_view_classes(resolver.url_patterns))
+
+        primed = warmup.prime_serializers(resolver)
+
+        self.assertIn(RecipeSerializer, {getattr(view, "serializer_class", None) for view in view_classes})
+        self.assertGreaterEqual(primed, 5)
+
+    def test_warmup_summary(self):
+        """Test warmup connects and reports what it did"""
+        summary = warmup.warmup()
+
+        self.assertIn("database connections", summary)
@@ -0,0 +1,109 @@
+"""Sliding-window request throttles.
+
+Each throttle counts requests in fixed windows of the rate's duration and
+estimates the rate over the last full duration as the current window's
+count plus the previous one's, weighted by how much of it still overlaps.
+That needs two counters per client instead of DRF's list of timestamps and
+does not let a client burst twice the limit at a window boundary.
+
+Counters live in the ``shared`` cache. Under gunicorn that is a file
+cache on /dev/shm shared by every worker, see ``app.gunicorn_conf``.
+Increments there are not atomic, so concurrent requests may occasionally
+be undercounted.
+"""
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """Base class, subclasses define ``scope`` and ``get_cache_key()``"""
+
+    cache_format = "throttle:%(scope)s:%(ident)s"
+
+    @property
+    def cache(self):
+        return caches["shared"]
+
+    def counter_key(self, window):
+        return f"{self.key}:{window}"
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        self.elapsed = now - window * self.duration
+        current_key = self.counter_key(window)
+        previous_key = self.counter_key(window - 1)
+        counts = self.cache.get_many([current_key, previous_key])
+        self.current = counts.get(current_key, 0)
+        self.previous = counts.get(previous_key, 0)
+
+        overlap = (self.duration - self.elapsed) / self.duration
+        if self.previous * overlap + self.current + 1 > self.num_requests:
+            return False
+        # Counters must outlive the window after theirs
+        if not self.cache.add(current_key, 1, 2 * self.duration):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, 2 * self.duration)
+        return True
+
+    def wait(self):
+        """Seconds until the weighted count drops below the limit"""
+        remaining = self.duration - self.elapsed
+        if self.current + 1 > self.num_requests or not self.previous:
+            return remaining
+        spare = self.num_requests - self.current - 1
+        return max(remaining - spare * self.duration / self.previous, 1)
+
+
+class UserThrottle(SlidingWindowThrottle):
+    """Limit authenticated users, whichever address they come from"""
+
+    scope = "user"
+
+    def get_cache_key(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": request.user.pk}
+
+
+class IPThrottle(SlidingWindowThrottle):
+    """Limit every client address, authenticated or not"""
+
+    scope = "ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class ScopedThrottle(SlidingWindowThrottle):
+    """Stricter limits for unsafe requests to views with a ``throttle_scope``
+
+    Counted per user, or per address for anonymous requests.
+    """
+
+    def __init__(self):
+        # The rate depends on the view, see allow_request()
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, "throttle_scope", None)
+        if not self.scope or request.method in ("GET", "HEAD", "OPTIONS"):
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f"user-{request.user.pk}"
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": self.scope, "ident": ident}
@@ -0,0 +1,18 @@
+from django.db import connections
+from django.db.utils import DatabaseError
+from django.http import JsonResponse
+
+
+def healthz(request):
+    """Liveness probe, answers as long as the process serves requests"""
+    return JsonResponse({"status": "ok"})
+
+
+def readyz(request):
+    """Readiness probe, checks the database answers queries"""
+    try:
+        with connections["default"].cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError:
+        return JsonResponse({"status": "unavailable", "database": False}, status=503)
+    return JsonResponse({"status": "ok", "database": True})
@@ -0,0 +1,60 @@
+"""Warm up a freshly started process before it serves requests.
+
+Called from the gunicorn hooks in ``app.gunicorn_conf``: once in the master
+after the application is preloaded, so the caches are shared with all
+workers, and again in every worker after it is forked to open its database
+connections.
+"""
+import time
+
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+
+def iter_view_classes(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_view_classes(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            view_class = getattr(pattern.callback, "cls", None)
+            if view_class is not None:
+                yield view_class
+
+
+def prime_resolvers():
+    """Build the URL resolver's reverse and lookup tables"""
+    resolver = get_resolver()
+    resolver.reverse_dict
+    return resolver
+
+
+def prime_serializers(resolver):
+    """Build the fields of every view's serializer, which loads model metadata"""
+    primed = set()
+    for view_class in iter_view_classes(resolver.url_patterns):
+        serializer_class = getattr(view_class, "serializer_class", None)
+        if serializer_class is None or serializer_class in primed:
+            continue
+        primed.add(serializer_class)
+        serializer_class().fields
+    return len(primed)
+
+
+def open_connections():
+    """Connect to every configured database"""
+    for conn in connections.all():
+        conn.ensure_connection()
+
+
+def warmup(connect=True):
+    """Prime caches and optionally connect, return a summary for the log"""
+    start = time.perf_counter()
+    resolver = prime_resolvers()
+    serializers = prime_serializers(resolver)
+    if connect:
+        open_connections()
+    return "Warmed up URL resolvers, {} serializers{} in {:.1f} ms".format(
+        serializers,
+        " and database connections" if connect else "",
+        (time.perf_counter() - start) * 1000,
+    )
@@ -0,0 +1,112 @@
+"""Autocomplete of tag and ingredient names.
+
+Suggestions are names starting with the text first, then names with a
+later word starting with it, each in order of the lowercased name. The
+database path relies on the ``text_pattern_ops`` index on ``name`` for the
+first and on the trigram index for the second. When ``AUTOCOMPLETE_CACHE`` is enabled each worker process keeps a
+per-user in-memory prefix index instead, dropped whenever the user's tags or
+ingredients change and expired after ``AUTOCOMPLETE_CACHE_TTL`` seconds so
+that changes made in other workers are picked up. Only the
+``AUTOCOMPLETE_CACHE_SIZE`` most recently used indexes are kept.
+"""
+import bisect
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Func
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import LRUCache
+from core.models import Ingredient, Tag
+
+
+_indexes = LRUCache("AUTOCOMPLETE_CACHE_SIZE", 1000, "AUTOCOMPLETE_CACHE_TTL", 60)
+
+
+class PrefixIndex:
+    """Sorted arrays of lowercased names and name words, searched with bisect"""
+
+    def __init__(self, rows):
+        self.names = {}
+        names = []
+        words = []
+        for pk, name in rows:
+            self.names[pk] = name
+            lowered = name.lower()
+            names.append((lowered, pk))
+            parts = lowered.split(" ")
+            for position in range(1, len(parts)):
+                words.append((" ".join(parts[position:]), pk))
+        names.sort()
+        words.sort()
+        self.levels = [
+            ([key for key, _ in names], [pk for _, pk in names]),
+            ([key for key, _ in words], [pk for _, pk in words]),
+        ]
+
+    def suggest(self, text, limit):
+        """Return up to limit names starting with text, then names with a word starting with it"""
+        prefix = text.lower()
+        results = []
+        seen = set()
+        for keys, pks in self.levels:
+            position = bisect.bisect_left(keys, prefix)
+            found = []
+            while position < len(keys) and keys[position].startswith(prefix):
+                pk = pks[position]
+                position += 1
+                if pk not in seen:
+                    seen.add(pk)
+                    found.append(pk)
+            # Word matches are sorted by the word, order them by name
+            found.sort(key=lambda pk: (self.names[pk].lower(), pk))
+            results += [{"id": pk, "name": self.names[pk]} for pk in found]
+            if len(results) >= limit:
+                return results[:limit]
+        return results
+
+
+def get_index(queryset, user):
+    """Return the cached prefix index of the user's names, building it if needed"""
+    return _indexes.get_or_build(
+        (queryset.model._meta.label, user.pk),
+        lambda: PrefixIndex(queryset.filter(user=user).values_list("id", "name")),
+    )
+
+
+def invalidate(model, user_id):
+    """Drop the cached prefix index of a user"""
+    _indexes.pop((model._meta.label, user_id))
+
+
+def name_order():
+    """Lowercased name in code point order, the order of the prefix index"""
+    if connection.vendor == "postgresql":
+        return Func(Lower("name"), template='%(expressions)s COLLATE "C"')
+    return Lower("name")
+
+
+def suggest(queryset, user, text, limit):
+    """Return up to limit {id, name} suggestions for the user's objects"""
+    if getattr(settings, "AUTOCOMPLETE_CACHE", False):
+        return get_index(queryset, user).suggest(text, limit)
+
+    queryset = queryset.filter(user=user).order_by(name_order(), "id")
+    results = list(queryset.filter(name__istartswith=text).values("id", "name")[:limit])
+    if len(results) < limit:
+        found = queryset.filter(name__icontains=" " + text).exclude(
+            id__in=[result["id"] for result in results]
+        )
+        results += list(found.values("id", "name")[: limit - len(results)])
+    return results
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_changed(sender, instance, **kwargs):
+    """Invalidate cached suggestions of the owner of a changed object"""
+    invalidate(sender, instance.user_id)
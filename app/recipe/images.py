@@ -0,0 +1,211 @@
+"""Background processing of uploaded recipe images.
+
+``upload_image`` only streams the upload to a temporary file and queues it.
+Decoding, EXIF orientation fixing and re-encoding without metadata happen
+in a bounded process pool so that sync gunicorn workers are not tied up by
+large photos. Downscaled variants (``IMAGE_VARIANTS``) are rendered in the
+same job and stored next to the original under immutable, content-hashed
+names that can be cached forever. Originals go to the deduplicated blob
+store of ``core.blobs``; uploading a file that was stored before reuses it
+without processing. Pool processes are started with
+``IMAGE_PROCESSING_START_METHOD`` rather than forked from the threaded web
+worker, and run ``recipe.processing``. When ``IMAGE_PROCESSING_WORKERS``
+is 0 images are processed inline, which is what the tests use.
+"""
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core import blobs, pool
+from core.models import Recipe, RecipeImageVariant, recipe_image_variant_path
+from recipe.processing import process_image
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when too many images are already waiting to be processed"""
+
+
+def _create_executor():
+    # multiprocessing is slow to import and most requests never need it
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Forking a threaded worker can copy locks held by other threads
+    # into the child, pool processes are started from a clean server
+    context = multiprocessing.get_context(settings.IMAGE_PROCESSING_START_METHOD)
+    if settings.IMAGE_PROCESSING_START_METHOD == "forkserver":
+        context.set_forkserver_preload(["recipe.processing"])
+    return ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESSING_WORKERS, mp_context=context)
+
+
+_executor = pool.LazyExecutor(_create_executor)
+# Uploads waiting for or in processing in the current worker
+_slots = pool.PerProcess(
+    lambda: threading.BoundedSemaphore(settings.IMAGE_PROCESSING_QUEUE_SIZE)
+)
+
+
+def spool_upload(upload):
+    """Stream an uploaded file to a temporary file and return its path"""
+    ext = os.path.splitext(upload.name)[1].lower()
+    fd, path = tempfile.mkstemp(suffix=ext, dir=settings.IMAGE_PROCESSING_TMP_DIR)
+    with os.fdopen(fd, "wb") as out:
+        for chunk in upload.chunks():
+            out.write(chunk)
+    return path
+
+
+def _store_variants(name, variants):
+    """Save variant files under content-hashed names, return unsaved rows"""
+    files = {}
+    objs = []
+    for variant in variants:
+        variant_name = recipe_image_variant_path(
+            os.path.splitext(name)[0] + os.path.splitext(variant["path"])[1],
+            variant["name"],
+            variant["digest"],
+        )
+        files[variant_name] = variant["path"]
+        objs.append(
+            RecipeImageVariant(
+                name=variant["name"],
+                format=variant["format"],
+                width=variant["width"],
+                height=variant["height"],
+                image=variant_name,
+            )
+        )
+    blobs.store_variants(name, files)
+    return objs
+
+
+def _attach(recipe_id, name, variants):
+    """Point a recipe at a stored image, releasing the image it replaces
+
+    The caller holds a reference to ``name``. The recipe row is locked while
+    its image and variants are swapped, so that overlapping uploads each
+    see the image the other one attached and release every blob once.
+    """
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(pk=recipe_id).first()
+        if recipe is not None:
+            old_name = recipe.image.name
+            for variant in variants:
+                variant.recipe = recipe
+            RecipeImageVariant.objects.filter(recipe=recipe).delete()
+            RecipeImageVariant.objects.bulk_create(variants)
+            Recipe.objects.filter(pk=recipe_id).update(
+                image=name, image_status=Recipe.IMAGE_READY
+            )
+    # Released once the swap is committed, the recipe already held a
+    # reference when it pointed at the same image
+    if recipe is None or old_name == name:
+        blobs.release(name)
+    else:
+        blobs.release(old_name)
+
+
+def store_image(recipe_id, path, result=None, error=None, source_digest=None):
+    """Attach a processed image to a recipe, or mark the processing failed"""
+    leftovers = [path]
+    if result:
+        leftovers.append(result["path"])
+        leftovers += [variant["path"] for variant in result["variants"]]
+    try:
+        if error is not None or result is None:
+            logger.warning("Processing image of recipe %s failed: %s", recipe_id, error)
+            Recipe.objects.filter(pk=recipe_id).update(image_status=Recipe.IMAGE_FAILED)
+            return
+        name = blobs.store(result["path"], result["digest"], source_digest)
+        variants = _store_variants(name, result["variants"])
+        _attach(recipe_id, name, variants)
+    finally:
+        for leftover in leftovers:
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def reuse_image(recipe, source_digest):
+    """Attach an already stored image uploaded before, return True on success"""
+    blob = blobs.find(source_digest)
+    if blob is not None and recipe.image.name == blob.name:
+        # Uploaded again to the same recipe, its variants are already there
+        return True
+    if blob is None or not blobs.acquire(blob.name):
+        return False
+    variants = RecipeImageVariant.objects.filter(recipe__image=blob.name).exclude(
+        recipe=recipe
+    )
+    seen = set()
+    objs = []
+    for variant in variants:
+        if (variant.name, variant.format) not in seen:
+            seen.add((variant.name, variant.format))
+            variant.pk = None
+            objs.append(variant)
+    _attach(recipe.pk, blob.name, objs)
+    return True
+
+
+def _done(recipe_id, path, source_digest, future):
+    """Store the outcome of a pool job, runs in a thread of the parent"""
+    try:
+        error = future.exception()
+        result = None if error else future.result()
+        store_image(recipe_id, path, result, error, source_digest)
+    except Exception:
+        logger.exception("Storing image of recipe %s failed", recipe_id)
+    finally:
+        _slots.get().release()
+        close_old_connections()
+
+
+def enqueue(recipe, upload):
+    """Queue an uploaded image for processing and mark the recipe pending"""
+    options = (
+        settings.IMAGE_JPEG_QUALITY,
+        settings.IMAGE_VARIANTS,
+        settings.IMAGE_VARIANT_FORMATS,
+    )
+    source_digest = getattr(upload, "sha256", None)
+    if reuse_image(recipe, source_digest):
+        return
+
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        path = spool_upload(upload)
+        Recipe.objects.filter(pk=recipe.pk).update(image_status=Recipe.IMAGE_PENDING)
+        try:
+            result = process_image(path, *options)
+        except Exception as error:
+            store_image(recipe.pk, path, error=error)
+        else:
+            store_image(recipe.pk, path, result, source_digest=source_digest)
+        return
+
+    slots = _slots.get()
+    if not slots.acquire(blocking=False):
+        raise QueueFull
+    try:
+        path = spool_upload(upload)
+        Recipe.objects.filter(pk=recipe.pk).update(image_status=Recipe.IMAGE_PENDING)
+        future = _executor.submit(process_image, path, *options)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda f: _done(recipe.pk, path, source_digest, f))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Release the image of a deleted recipe"""
+    blobs.release(instance.image.name)
@@ -0,0 +1,66 @@
+"""Image decoding and encoding run in the processes of the image pool.
+
+Kept free of Django imports, pool processes are started with the
+``forkserver`` method and import this module on their own, see
+``recipe.images``.
+"""
+import hashlib
+
+
+VARIANT_FORMATS = {"jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+
+
+def _save(img, out_path, fmt, quality):
+    """Encode an image without metadata and return the SHA-256 of the file"""
+    options = {"optimize": True}
+    if fmt != "PNG":
+        options["quality"] = quality
+    img.save(out_path, fmt, **options)
+    digest = hashlib.sha256()
+    with open(out_path, "rb") as saved:
+        for chunk in iter(lambda: saved.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def process_image(path, quality, variants=None, formats=()):
+    """Decode, orient and re-encode an image without metadata
+
+    Also renders a downscaled copy for every variant name -> max size in
+    each of the formats. Runs in a pool process and returns the paths of
+    the processed files.
+    """
+    from PIL import Image, ImageOps, features
+
+    result = {"variants": []}
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            result["path"] = path + ".out.png"
+            result["digest"] = _save(img, result["path"], "PNG", quality)
+        else:
+            img = img.convert("RGB")
+            result["path"] = path + ".out.jpg"
+            result["digest"] = _save(img, result["path"], "JPEG", quality)
+
+        for name, size in (variants or {}).items():
+            resized = img.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            for format_name in formats:
+                fmt, ext = VARIANT_FORMATS[format_name]
+                if fmt == "WEBP" and not features.check("webp"):
+                    continue
+                if fmt == "JPEG" and resized.mode != "RGB":
+                    resized = resized.convert("RGB")
+                out_path = f"{path}.{name}{ext}"
+                result["variants"].append(
+                    {
+                        "name": name,
+                        "format": format_name,
+                        "width": resized.width,
+                        "height": resized.height,
+                        "path": out_path,
+                        "digest": _save(resized, out_path, fmt, quality),
+                    }
+                )
+    return result
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, RecipeImageVariant, Tag, Ingredient
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -20,6 +20,17 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
+class RecipeImageVariantSerializer(serializers.ModelSerializer):
+    """Serializer for resized copies of recipe images"""
+
+    url = serializers.ImageField(source="image", read_only=True)
+
+    class Meta:
+        model = RecipeImageVariant
+        fields = ("name", "format", "width", "height", "url")
+        read_only_fields = fields
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serialize a recipe"""
 
@@ -27,10 +38,13 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True, queryset=Ingredient.objects.all()
     )
     tags = serializers.PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    image_variants = RecipeImageVariantSerializer(many=True, read_only=True)
 
     class Meta:
         model = Recipe
-        fields = ("id", "title", "ingredients", "tags", "time_minutes", "price", "link")
+        fields = (
+            "id", "title", "ingredients", "tags", "time_minutes", "price", "link", "image_variants"
+        )
         read_only_fields = ("id",)
 
 
@@ -41,10 +55,53 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class RecipeCoverageSerializer(RecipeSerializer):
+    """Serialize a recipe with its coverage by the ingredients on hand"""
+
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ("matched_count", "missing_count")
+
+
+class RecipeSimilaritySerializer(RecipeSerializer):
+    """Serialize a recipe with its similarity to another recipe"""
+
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ("similarity",)
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
-    """Serializer for uploading images to recipes"""
+    """Serializer for uploading images to recipes
+
+    The upload is only checked to be a file here, decoding and validating
+    the image happens in the background, see recipe.images.
+    """
+
+    image = serializers.FileField()
+    image_variants = RecipeImageVariantSerializer(many=True, read_only=True)
 
     class Meta:
         model = Recipe
-        fields = ("id", "image")
-        read_only_fields = ("id",)
+        fields = ("id", "image", "image_status", "image_variants")
+        read_only_fields = ("id", "image_status")
+
+
+class ShoppingListIngredientSerializer(serializers.Serializer):
+    """Serialize an ingredient of a shopping list"""
+
+    id = serializers.IntegerField(source="ingredient_id")
+    name = serializers.CharField(source="ingredient__name")
+    count = serializers.IntegerField()
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    """Serialize a shopping list aggregated over recipes"""
+
+    recipes = serializers.IntegerField()
+    time_minutes = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    ingredients = ShoppingListIngredientSerializer(many=True)
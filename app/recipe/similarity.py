@@ -0,0 +1,133 @@
+"""Similar recipes by Jaccard overlap of their ingredient and tag sets.
+
+Every user's recipes are turned into a bit-packed NumPy matrix with one row
+per recipe and one bit per ingredient or tag, built straight from the M2M
+through tables. Intersections are computed for all rows at once with a
+bitwise AND and a byte popcount table. Matrices are cached per process and
+user, dropped whenever the user's recipes, tags or ingredients change and
+expired after ``SIMILAR_RECIPES_CACHE_TTL`` seconds so that changes made in
+other workers are picked up. Only the ``SIMILAR_RECIPES_CACHE_SIZE`` most
+recently used matrices are kept. NumPy is only imported once the first matrix
+is built, so workers never asked for similar recipes don't load it.
+"""
+import functools
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import LRUCache
+from core.models import Ingredient, Recipe, Tag
+
+
+_matrices = LRUCache("SIMILAR_RECIPES_CACHE_SIZE", 100, "SIMILAR_RECIPES_CACHE_TTL", 300)
+
+
+@functools.lru_cache(maxsize=None)
+def popcount_table():
+    """Number of set bits of every byte value"""
+    import numpy as np
+
+    return np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint16)
+
+
+class FeatureMatrix:
+    """Bit-packed recipe x (ingredient + tag) incidence matrix of a user"""
+
+    def __init__(self, recipe_ids, ingredient_pairs, tag_pairs):
+        import numpy as np
+
+        self.recipe_ids = np.array(recipe_ids, dtype=np.int64)
+        self.rows = {recipe_id: row for row, recipe_id in enumerate(recipe_ids)}
+        columns = {}
+        rows = []
+        cols = []
+        for kind, pairs in (("i", ingredient_pairs), ("t", tag_pairs)):
+            for recipe_id, feature_id in pairs:
+                if recipe_id not in self.rows:
+                    # Recipe created after the recipe ids were read
+                    continue
+                rows.append(self.rows[recipe_id])
+                cols.append(columns.setdefault((kind, feature_id), len(columns)))
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        self.bits = np.zeros((len(recipe_ids), (len(columns) + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(
+            self.bits, (rows, cols >> 3), (128 >> (cols & 7)).astype(np.uint8)
+        )
+        self.sizes = np.bincount(rows, minlength=len(recipe_ids))
+
+    @classmethod
+    def for_user(cls, user):
+        """Build the matrix of a user's recipes from the through tables"""
+        recipe_ids = list(
+            Recipe.objects.filter(user=user).order_by("id").values_list("id", flat=True)
+        )
+        ingredient_pairs = Recipe.ingredients.through.objects.filter(
+            recipe__user=user
+        ).values_list("recipe_id", "ingredient_id")
+        tag_pairs = Recipe.tags.through.objects.filter(recipe__user=user).values_list(
+            "recipe_id", "tag_id"
+        )
+        return cls(recipe_ids, ingredient_pairs, tag_pairs)
+
+    def similar(self, recipe_id, limit):
+        """Return up to limit (recipe id, similarity) pairs, most similar first"""
+        import numpy as np
+
+        row = self.rows.get(recipe_id)
+        if row is None or not self.sizes[row]:
+            return []
+        # Only the bytes set in the recipe's own row can contribute
+        columns = np.flatnonzero(self.bits[row])
+        intersection = popcount_table()[self.bits[:, columns] & self.bits[row, columns]].sum(axis=1)
+        union = self.sizes + self.sizes[row] - intersection
+        scores = intersection / np.maximum(union, 1)
+        scores[row] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        # Highest score first, newest recipe first on ties
+        order = np.lexsort((-self.recipe_ids[candidates], -scores[candidates]))
+        return [
+            (int(self.recipe_ids[index]), float(scores[index]))
+            for index in candidates[order]
+        ]
+
+
+def get_matrix(user):
+    """Return the cached feature matrix of a user, building it if needed"""
+    return _matrices.get_or_build(user.pk, lambda: FeatureMatrix.for_user(user))
+
+
+def invalidate(user_id):
+    """Drop the cached feature matrix of a user"""
+    _matrices.pop(user_id)
+
+
+def similar_recipes(recipe, limit):
+    """Return up to limit (recipe id, similarity) pairs for the recipe's owner"""
+    return get_matrix(recipe.user).similar(recipe.pk, limit)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, **kwargs):
+    """Invalidate the matrix when tags or ingredients are (un)assigned"""
+    if action.startswith("post_"):
+        invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    """Invalidate the matrix when a recipe is added"""
+    if created:
+        invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_or_attr_deleted(sender, instance, **kwargs):
+    """Invalidate the matrix when a recipe, tag or ingredient is removed"""
+    invalidate(instance.user_id)
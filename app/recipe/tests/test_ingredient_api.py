@@ -10,6 +10,7 @@ from recipe.serializers import IngredientSerializer  # type: ignore
 
 
 INGREDIENTS_URL = reverse("recipe:ingredient-list")
+INGREDIENTS_AUTOCOMPLETE_URL = reverse("recipe:ingredient-autocomplete")
 
 
 def create_recipe(user, **kwargs):
@@ -109,3 +110,17 @@ class PrivateIngredientsApiTests(TestCase):
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
 
         self.assertEqual(len(res.data), 1)  # type: ignore
+
+    def test_autocomplete_ingredients(self):
+        """Test autocomplete suggests ingredients by prefix and substring"""
+        Ingredient.objects.create(user=self.user, name="Salt")
+        Ingredient.objects.create(user=self.user, name="Salmon")
+        Ingredient.objects.create(user=self.user, name="Basalt salt")
+        Ingredient.objects.create(user=self.user, name="Sugar")
+
+        res = self.client.get(INGREDIENTS_AUTOCOMPLETE_URL, {"q": "SAL", "limit": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [ingredient["name"] for ingredient in res.data], ["Salmon", "Salt"]  # type: ignore
+        )
@@ -1,19 +1,34 @@
 import tempfile
 import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import skipUnless
+from unittest.mock import patch
 
 from PIL import Image
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
-from core.models import Recipe, Tag, Ingredient
+from core import pool
+from core.models import ImageBlob, Recipe, RecipeImageVariant, Tag, Ingredient
+from core.throttling import IPThrottle, UserThrottle
+from recipe import images, similarity
+from recipe.processing import process_image
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer  # type: ignore
 from django.db.models.query import QuerySet
 
 RECIPE_URL = reverse("recipe:recipe-list")
+COOKABLE_URL = reverse("recipe:recipe-cookable")
+SHOPPING_LIST_URL = reverse("recipe:recipe-shopping-list")
 
 
 def image_upload_url(recipe_id):
@@ -21,6 +36,11 @@ def image_upload_url(recipe_id):
     return reverse("recipe:recipe-upload-image", args=[recipe_id])
 
 
+def similar_url(recipe_id):
+    """Return URL for similar recipes"""
+    return reverse("recipe:recipe-similar", args=[recipe_id])
+
+
 def detail_url(recipe_id: int) -> str:
     return reverse("recipe:recipe-detail", args=[recipe_id])
 
@@ -199,7 +219,57 @@ class PrivateRecipeApiTest(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(tags.count(), 0)
 
+    def add_variant(self, recipe, name="thumb"):
+        return RecipeImageVariant.objects.create(
+            recipe=recipe,
+            name=name,
+            format="webp",
+            width=160,
+            height=120,
+            image=f"blobs/ab/{recipe.id}.{name}.webp",
+        )
 
+    def test_recipes_include_image_variants(self):
+        """Test listed and detailed recipes carry their image variant URLs"""
+        recipe = sample_recipe(user=self.user)
+        self.add_variant(recipe)
+
+        for url in (RECIPE_URL, detail_url(recipe.id)):
+            res = self.client.get(url)
+            data = res.data[0] if url == RECIPE_URL else res.data  # type: ignore
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(data["image_variants"]), 1)
+            variant = data["image_variants"][0]
+            self.assertEqual(variant["name"], "thumb")
+            self.assertEqual(variant["width"], 160)
+            self.assertTrue(variant["url"].endswith(f"blobs/ab/{recipe.id}.thumb.webp"))
+
+    def test_list_queries_independent_of_recipe_count(self):
+        """Test tags, ingredients and variants are prefetched, not loaded per recipe"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+
+        def add_recipe():
+            recipe = sample_recipe(user=self.user)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+            self.add_variant(recipe)
+            self.add_variant(recipe, name="large")
+
+        add_recipe()
+        with CaptureQueriesContext(connection) as one_recipe:
+            self.client.get(RECIPE_URL)
+        for _ in range(4):
+            add_recipe()
+        with CaptureQueriesContext(connection) as five_recipes:
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data), 5)  # type: ignore
+        self.assertEqual(len(five_recipes), len(one_recipe))
+
+
+@override_settings(IMAGE_PROCESSING_WORKERS=0)
 class RecipeImageUploadTests(TestCase):
     """Testing image uploading"""
 
@@ -213,6 +283,8 @@ class RecipeImageUploadTests(TestCase):
         self.recipe = sample_recipe(user=self.user)
 
     def tearDown(self):
+        for variant in self.recipe.image_variants.all():
+            variant.image.delete(save=False)
         self.recipe.image.delete()
 
     def test_upload_image_to_recipe(self):
@@ -225,11 +297,243 @@ class RecipeImageUploadTests(TestCase):
             ntf.seek(0)
             res = self.client.post(url, {"image": ntf}, format="multipart")
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
 
         self.assertIn("image", res.data)  # type: ignore
+        self.assertEqual(res.data["image_status"], Recipe.IMAGE_READY)  # type: ignore
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    @override_settings(IMAGE_VARIANTS={"thumb": 50}, IMAGE_VARIANT_FORMATS=("jpeg",))
+    def test_upload_image_creates_variants(self):
+        """Test resized variants are stored under content-hashed names"""
+        url = image_upload_url(self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            img = Image.new("RGB", (200, 100))
+            img.save(ntf, format="JPEG")
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        variants = res.data["image_variants"]  # type: ignore
+        self.assertEqual(len(variants), 1)
+        self.assertEqual(variants[0]["name"], "thumb")
+        self.assertEqual((variants[0]["width"], variants[0]["height"]), (50, 25))
+        self.assertRegex(variants[0]["url"], r"/upload/recipe/[0-9a-f]{2}/[0-9a-f]{64}\.thumb\.[0-9a-f]{16}\.jpg$")
+        variant = self.recipe.image_variants.get()
+        self.assertTrue(os.path.exists(variant.image.path))
+
+    def test_upload_same_image_stored_once(self):
+        """Test identical uploads share one reference counted file"""
+        recipe2 = sample_recipe(user=self.user, title="Second recipe")
+
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            Image.new("RGB", (10, 10), "red").save(ntf, format="PNG")
+            for recipe in (self.recipe, recipe2):
+                ntf.seek(0)
+                self.client.post(image_upload_url(recipe.id), {"image": ntf}, format="multipart")
+        self.recipe.refresh_from_db()
+        recipe2.refresh_from_db()
+
+        self.assertEqual(self.recipe.image.name, recipe2.image.name)
+        self.assertEqual(recipe2.image_status, Recipe.IMAGE_READY)
+        blob = ImageBlob.objects.get(name=self.recipe.image.name)
+        self.assertEqual(blob.ref_count, 2)
+
+        recipe2.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_replaced_image_released(self):
+        """Test the file of a replaced image is deleted with its last reference"""
+        url = image_upload_url(self.recipe.id)
+        for color in ("red", "blue"):
+            with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+                Image.new("RGB", (10, 10), color).save(ntf, format="PNG")
+                ntf.seek(0)
+                self.client.post(url, {"image": ntf}, format="multipart")
+            if color == "red":
+                self.recipe.refresh_from_db()
+                first_path = self.recipe.image.path
+
+        self.assertFalse(os.path.exists(first_path))
+        self.assertEqual(ImageBlob.objects.count(), 1)
+
+    def test_replaced_image_variants_released(self):
+        """Test the variant files of a replaced image are deleted with it"""
+        url = image_upload_url(self.recipe.id)
+        for color in ("red", "blue"):
+            with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+                Image.new("RGB", (10, 10), color).save(ntf, format="PNG")
+                ntf.seek(0)
+                self.client.post(url, {"image": ntf}, format="multipart")
+            if color == "red":
+                first_variants = [v.image.path for v in self.recipe.image_variants.all()]
+
+        self.assertTrue(first_variants)
+        for path in first_variants:
+            self.assertFalse(os.path.exists(path))
+
+    def test_reupload_same_image_keeps_variants(self):
+        """Test uploading the same image to the same recipe again keeps it intact"""
+        url = image_upload_url(self.recipe.id)
+        for _ in range(2):
+            with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+                Image.new("RGB", (10, 10), "red").save(ntf, format="PNG")
+                ntf.seek(0)
+                res = self.client.post(url, {"image": ntf}, format="multipart")
+            self.recipe.refresh_from_db()
+            self.assertEqual(len(res.data["image_variants"]), 6)  # type: ignore
+
+        self.assertEqual(self.recipe.image_variants.count(), 6)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+
+    def test_overlapping_uploads_release_replaced_image_once(self):
+        """Test two jobs attaching the same image release the old one once"""
+        recipe2 = sample_recipe(user=self.user, title="Second recipe")
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            Image.new("RGB", (10, 10), "red").save(ntf, format="PNG")
+            for recipe in (self.recipe, recipe2):
+                ntf.seek(0)
+                self.client.post(image_upload_url(recipe.id), {"image": ntf}, format="multipart")
+        self.recipe.refresh_from_db()
+        old_name = self.recipe.image.name
+
+        options = (
+            settings.IMAGE_JPEG_QUALITY,
+            settings.IMAGE_VARIANTS,
+            settings.IMAGE_VARIANT_FORMATS,
+        )
+        for _ in range(2):
+            # An upload and its retry, both processed before either is attached
+            path = images.spool_upload(SimpleUploadedFile("blue.png", b""))
+            Image.new("RGB", (10, 10), "blue").save(path, format="PNG")
+            images.store_image(self.recipe.id, path, process_image(path, *options))
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(ImageBlob.objects.get(name=old_name).ref_count, 1)
+        self.assertEqual(ImageBlob.objects.get(name=self.recipe.image.name).ref_count, 1)
+        self.assertEqual(self.recipe.image_variants.count(), 6)
+        for variant in self.recipe.image_variants.all():
+            self.assertTrue(os.path.exists(variant.image.path))
+        recipe2.delete()
+
+    def test_upload_image_applies_exif_orientation(self):
+        """Test uploaded images are rotated upright and stripped of EXIF"""
+        url = image_upload_url(self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            img = Image.new("RGB", (20, 10))
+            exif = Image.Exif()
+            exif[0x0112] = 6  # rotated 90 degrees clockwise
+            img.save(ntf, format="JPEG", exif=exif.tobytes())
+            ntf.seek(0)
+            self.client.post(url, {"image": ntf}, format="multipart")
+        self.recipe.refresh_from_db()
+
+        with Image.open(self.recipe.image.path) as processed:
+            self.assertEqual(processed.size, (10, 20))
+            self.assertNotIn(0x0112, processed.getexif())
+
+    def test_upload_corrupt_image_fails(self):
+        """Test an image that cannot be decoded is marked failed"""
+        url = image_upload_url(self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            img = Image.frombytes("RGB", (100, 100), os.urandom(30000))
+            img.save(ntf, format="JPEG")
+            ntf.truncate(ntf.tell() // 2)
+            ntf.seek(0)
+            with self.assertLogs("recipe.images", "WARNING"):
+                res = self.client.post(url, {"image": ntf}, format="multipart")
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data["image_status"], Recipe.IMAGE_FAILED)  # type: ignore
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_not_an_image_rejected(self):
+        """Test a file without an image header is rejected upfront"""
+        url = image_upload_url(self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            ntf.write(b"not an image")
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["image"], ["Upload a valid image."])  # type: ignore
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=99)
+    def test_upload_image_too_many_pixels_rejected(self):
+        """Test images with too many pixels are rejected before decoding"""
+        url = image_upload_url(self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            Image.new("RGB", (10, 10)).save(ntf, format="PNG")
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, "")
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_upload_image_too_large_rejected(self):
+        """Test uploads larger than the configured size are rejected"""
+        url = image_upload_url(self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            ntf.write(os.urandom(4096))
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_unsupported_format_rejected(self):
+        """Test image formats outside the allowed list are rejected"""
+        url = image_upload_url(self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix=".bmp") as ntf:
+            Image.new("RGB", (10, 10)).save(ntf, format="BMP")
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_queue_full(self):
+        """Test uploads are rejected while the processing queue is full"""
+        url = image_upload_url(self.recipe.id)
+
+        with patch("recipe.images.enqueue", side_effect=images.QueueFull):
+            with tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+                Image.new("RGB", (10, 10)).save(ntf, format="PNG")
+                ntf.seek(0)
+                res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("Retry-After", res)
+
+    @override_settings(IMAGE_PROCESSING_WORKERS=1)
+    def test_upload_image_replaces_broken_pool(self):
+        """Test a pool broken by a dead child is replaced for the next upload"""
+        url = image_upload_url(self.recipe.id)
+        executors = iter([BrokenPoolExecutor(), InlineExecutor()])
+        executor = pool.LazyExecutor(lambda: next(executors))
+
+        with patch.object(images, "_executor", executor), patch.object(
+            images, "close_old_connections"
+        ), tempfile.NamedTemporaryFile(suffix=".png") as ntf:
+            Image.new("RGB", (10, 10)).save(ntf, format="PNG")
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertIsInstance(executor.get(), InlineExecutor)
+
     def test_upload_image_bad_request(self):
         """Test uploading an inalid image"""
 
@@ -280,3 +584,370 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn(serializer1.data, res.data)  # type: ignore
         self.assertIn(serializer2.data, res.data)  # type: ignore
         self.assertNotIn(serializer3.data, res.data)  # type: ignore
+
+
+class InlineExecutor:
+    """Executor running jobs in the calling thread"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class BrokenPoolExecutor(InlineExecutor):
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+
+class RecipeSearchTests(TestCase):
+    """Test full-text searching of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_search_recipes_by_title(self):
+        """Test searching recipes by words of the title"""
+        recipe1 = sample_recipe(user=self.user, title="Thai green curry")
+        sample_recipe(user=self.user, title="Fish and chips")
+
+        res = self.client.get(RECIPE_URL, {"search": "curry"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data], [recipe1.id])  # type: ignore
+
+    def test_search_recipes_by_tag_and_ingredient(self):
+        """Test searching matches tag and ingredient names"""
+        recipe1 = sample_recipe(user=self.user, title="Pancakes")
+        recipe2 = sample_recipe(user=self.user, title="Omelette")
+        recipe1.tags.add(sample_tag(user=self.user, name="Breakfast"))
+        recipe2.ingredients.add(sample_ingredient(user=self.user, name="Eggs"))
+
+        res1 = self.client.get(RECIPE_URL, {"search": "breakfast"})
+        res2 = self.client.get(RECIPE_URL, {"search": "eggs"})
+
+        self.assertEqual([r["id"] for r in res1.data], [recipe1.id])  # type: ignore
+        self.assertEqual([r["id"] for r in res2.data], [recipe2.id])  # type: ignore
+
+    def test_search_ranks_title_above_ingredient(self):
+        """Test title matches are ranked before ingredient matches"""
+        recipe1 = sample_recipe(user=self.user, title="Pasta bake")
+        recipe1.ingredients.add(sample_ingredient(user=self.user, name="Garlic"))
+        recipe2 = sample_recipe(user=self.user, title="Garlic bread")
+
+        res = self.client.get(RECIPE_URL, {"search": "garlic"})
+
+        self.assertEqual(
+            [r["id"] for r in res.data], [recipe2.id, recipe1.id]  # type: ignore
+        )
+
+    def test_search_follows_renamed_ingredient(self):
+        """Test renaming an ingredient updates the search index"""
+        recipe = sample_recipe(user=self.user, title="Salad")
+        ingredient = sample_ingredient(user=self.user, name="Lettuce")
+        recipe.ingredients.add(ingredient)
+
+        ingredient.name = "Rocket"
+        ingredient.save()
+
+        res1 = self.client.get(RECIPE_URL, {"search": "lettuce"})
+        res2 = self.client.get(RECIPE_URL, {"search": "rocket"})
+
+        self.assertEqual(len(res1.data), 0)  # type: ignore
+        self.assertEqual([r["id"] for r in res2.data], [recipe.id])  # type: ignore
+
+    def test_search_matches_word_prefixes(self):
+        """Test every word of the query matches as a prefix, on every backend"""
+        recipe1 = sample_recipe(user=self.user, title="Chocolate cake")
+        recipe1.tags.add(sample_tag(user=self.user, name="Dessert"))
+        sample_recipe(user=self.user, title="Chocolate milk")
+        sample_recipe(user=self.user, title="Carrot cake")
+
+        res1 = self.client.get(RECIPE_URL, {"search": "choc"})
+        res2 = self.client.get(RECIPE_URL, {"search": "choc dess"})
+        res3 = self.client.get(RECIPE_URL, {"search": "!&"})
+
+        self.assertEqual(len(res1.data), 2)  # type: ignore
+        self.assertEqual([r["id"] for r in res2.data], [recipe1.id])  # type: ignore
+        self.assertEqual(len(res3.data), 0)  # type: ignore
+
+    @skipUnless(connection.vendor == "postgresql", "tsvector search needs PostgreSQL")
+    def test_postgres_search_uses_prefix_tsquery(self):
+        """Test the PostgreSQL query is a to_tsquery() of prefix terms on the GIN column"""
+        recipe = sample_recipe(user=self.user, title="Vegetable curry")
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPE_URL, {"search": "veget curr"})
+
+        self.assertEqual([r["id"] for r in res.data], [recipe.id])  # type: ignore
+        sql = next(query["sql"] for query in queries if "search_vector" in query["sql"])
+        self.assertIn("to_tsquery(", sql)
+        self.assertNotIn("plainto_tsquery(", sql)
+        self.assertIn("veget:* & curr:*", sql)
+
+    def test_search_limited_to_user(self):
+        """Test search only returns recipes of the authenticated user"""
+        user2 = get_user_model().objects.create_user(  # type: ignore
+            email="other@test.com", password="testpass"
+        )
+        sample_recipe(user=user2, title="Lemon tart")
+
+        res = self.client.get(RECIPE_URL, {"search": "lemon"})
+
+        self.assertEqual(len(res.data), 0)  # type: ignore
+
+
+class CookableRecipesTests(TestCase):
+    """Test looking up recipes by the ingredients on hand"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.eggs = sample_ingredient(user=self.user, name="Eggs")
+        self.milk = sample_ingredient(user=self.user, name="Milk")
+        self.flour = sample_ingredient(user=self.user, name="Flour")
+        self.bacon = sample_ingredient(user=self.user, name="Bacon")
+
+    def test_cookable_ranked_by_coverage(self):
+        """Test complete recipes come first, then those missing few ingredients"""
+        omelette = sample_recipe(user=self.user, title="Omelette")
+        omelette.ingredients.add(self.eggs, self.milk)
+        pancakes = sample_recipe(user=self.user, title="Pancakes")
+        pancakes.ingredients.add(self.eggs, self.milk, self.flour)
+        carbonara = sample_recipe(user=self.user, title="Carbonara")
+        carbonara.ingredients.add(self.eggs, self.flour, self.bacon)
+
+        res = self.client.get(
+            COOKABLE_URL, {"ingredients": f"{self.eggs.id},{self.milk.id}", "missing": 1}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r["id"], r["missing_count"]) for r in res.data],  # type: ignore
+            [(omelette.id, 0), (pancakes.id, 1)],
+        )
+
+    def test_cookable_defaults_to_complete_recipes(self):
+        """Test only recipes with every ingredient on hand are returned by default"""
+        omelette = sample_recipe(user=self.user, title="Omelette")
+        omelette.ingredients.add(self.eggs)
+        pancakes = sample_recipe(user=self.user, title="Pancakes")
+        pancakes.ingredients.add(self.eggs, self.flour)
+
+        res = self.client.get(COOKABLE_URL, {"ingredients": f"{self.eggs.id}"})
+
+        self.assertEqual([r["id"] for r in res.data], [omelette.id])  # type: ignore
+        self.assertEqual(res.data[0]["ingredients"], [self.eggs.id])  # type: ignore
+
+    def test_cookable_invalid_ingredients(self):
+        """Test non integer ingredient ids are rejected"""
+        res = self.client.get(COOKABLE_URL, {"ingredients": "eggs"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SimilarRecipesTests(TestCase):
+    """Test finding similar recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.eggs = sample_ingredient(user=self.user, name="Eggs")
+        self.milk = sample_ingredient(user=self.user, name="Milk")
+        self.flour = sample_ingredient(user=self.user, name="Flour")
+        self.breakfast = sample_tag(user=self.user, name="Breakfast")
+
+    def test_similar_recipes_ranked_by_jaccard(self):
+        """Test similar recipes are ordered by ingredient and tag overlap"""
+        pancakes = sample_recipe(user=self.user, title="Pancakes")
+        pancakes.ingredients.add(self.eggs, self.milk, self.flour)
+        pancakes.tags.add(self.breakfast)
+        crepes = sample_recipe(user=self.user, title="Crepes")
+        crepes.ingredients.add(self.eggs, self.milk, self.flour)
+        omelette = sample_recipe(user=self.user, title="Omelette")
+        omelette.ingredients.add(self.eggs)
+        omelette.tags.add(self.breakfast)
+        bread = sample_recipe(user=self.user, title="Bread")
+        bread.ingredients.add(sample_ingredient(user=self.user, name="Yeast"))
+
+        res = self.client.get(similar_url(pancakes.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r["id"], r["similarity"]) for r in res.data],  # type: ignore
+            [(crepes.id, 0.75), (omelette.id, 0.5)],
+        )
+
+    def test_similar_recipes_follow_changes(self):
+        """Test the cached matrix is refreshed when ingredients change"""
+        pancakes = sample_recipe(user=self.user, title="Pancakes")
+        pancakes.ingredients.add(self.eggs)
+        crepes = sample_recipe(user=self.user, title="Crepes")
+        crepes.ingredients.add(self.milk)
+
+        res1 = self.client.get(similar_url(pancakes.id))
+        crepes.ingredients.add(self.eggs)
+        res2 = self.client.get(similar_url(pancakes.id), {"limit": 1})
+
+        self.assertEqual(len(res1.data), 0)  # type: ignore
+        self.assertEqual([r["id"] for r in res2.data], [crepes.id])  # type: ignore
+
+    @override_settings(SIMILAR_RECIPES_CACHE_SIZE=2)
+    def test_similar_recipes_cache_evicts_least_recently_used(self):
+        """Test only the most recently used matrices are kept per process"""
+        self.addCleanup(similarity._matrices.clear)
+        users = [self.user] + [
+            get_user_model().objects.create_user(  # type: ignore
+                email=f"user{index}@test.com", password="testpass"
+            )
+            for index in range(2)
+        ]
+
+        for user in (users[0], users[1], users[0], users[2]):
+            similarity.get_matrix(user)
+
+        self.assertEqual(list(similarity._matrices), [users[0].pk, users[2].pk])
+
+    def test_similar_recipes_limited_to_user(self):
+        """Test similar recipes of another user are not accessible"""
+        user2 = get_user_model().objects.create_user(  # type: ignore
+            email="other@test.com", password="testpass"
+        )
+        recipe = sample_recipe(user=user2)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ShoppingListTests(TestCase):
+    """Test aggregating a shopping list over recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_shopping_list_aggregates_ingredients(self):
+        """Test ingredients are deduplicated with counts and totals summed"""
+        eggs = sample_ingredient(user=self.user, name="Eggs")
+        milk = sample_ingredient(user=self.user, name="Milk")
+        recipe1 = sample_recipe(user=self.user, time_minutes=10, price=2.50)
+        recipe1.ingredients.add(eggs, milk)
+        recipe2 = sample_recipe(user=self.user, time_minutes=25, price=4.00)
+        recipe2.ingredients.add(eggs)
+        sample_recipe(user=self.user, time_minutes=60, price=9.00)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                SHOPPING_LIST_URL, {"recipes": f"{recipe1.id},{recipe2.id}"}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["recipes"], 2)  # type: ignore
+        self.assertEqual(res.data["time_minutes"], 35)  # type: ignore
+        self.assertEqual(res.data["price"], "6.50")  # type: ignore
+        self.assertEqual(
+            [dict(i) for i in res.data["ingredients"]],  # type: ignore
+            [
+                {"id": eggs.id, "name": "Eggs", "count": 2},
+                {"id": milk.id, "name": "Milk", "count": 1},
+            ],
+        )
+
+    def test_shopping_list_limited_to_user(self):
+        """Test recipes of other users are ignored"""
+        user2 = get_user_model().objects.create_user(  # type: ignore
+            email="other@test.com", password="testpass"
+        )
+        recipe = sample_recipe(user=user2)
+        recipe.ingredients.add(sample_ingredient(user=user2))
+
+        res = self.client.get(SHOPPING_LIST_URL, {"recipes": f"{recipe.id}"})
+
+        self.assertEqual(res.data["recipes"], 0)  # type: ignore
+        self.assertEqual(res.data["price"], "0.00")  # type: ignore
+        self.assertEqual(res.data["ingredients"], [])  # type: ignore
+
+
+class RecipeMediaTests(TestCase):
+    """Test serving recipe images to their owners"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email="user@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.name = "upload/recipe/ab/" + "ab" * 32 + ".jpg"
+        self.recipe = sample_recipe(user=self.user, image=self.name)
+
+    def test_media_requires_auth(self):
+        """Test anonymous users cannot fetch media"""
+        res = APIClient().get(reverse("media", args=[self.name]))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_media_served_through_accel_redirect(self):
+        """Test the owner gets an X-Accel-Redirect to the file"""
+        res = self.client.get(reverse("media", args=[self.name]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["X-Accel-Redirect"], "/protected-media/" + self.name)
+        self.assertIn("immutable", res["Cache-Control"])
+
+    def test_media_not_throttled(self):
+        """Test fetching images does not count against the API rate limits"""
+        caches["shared"].clear()
+        with patch.object(UserThrottle, "rate", "3/min", create=True), patch.object(
+            IPThrottle, "rate", "3/min", create=True
+        ):
+            statuses = [
+                self.client.get(reverse("media", args=[self.name])).status_code
+                for _ in range(5)
+            ]
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(statuses, [status.HTTP_200_OK] * 5)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_media_limited_to_owner(self):
+        """Test images of other users' recipes are not served"""
+        user2 = get_user_model().objects.create_user(  # type: ignore
+            email="other@test.com", password="testpass"
+        )
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(reverse("media", args=[self.name]))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_URL="")
+    def test_media_streamed_without_nginx(self):
+        """Test the file is streamed by Django when redirects are disabled"""
+        with tempfile.TemporaryDirectory() as media_root:
+            path = os.path.join(media_root, self.name)
+            os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as f:
+                f.write(b"image")
+            with self.settings(MEDIA_ROOT=media_root):
+                res = self.client.get(reverse("media", args=[self.name]))
+                content = b"".join(res.streaming_content)
+                res.close()
+
+        self.assertEqual(content, b"image")
@@ -7,10 +7,12 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
+from recipe import autocomplete
 
 from recipe.serializers import TagSerializer  # type: ignore
 
 TAG_URL = reverse("recipe:tag-list")
+TAG_AUTOCOMPLETE_URL = reverse("recipe:tag-autocomplete")
 
 
 def create_payload(email="test@test.com", password="password"):
@@ -116,3 +118,80 @@ class PrivateTagsTests(TestCase):
         res = self.client.get(TAG_URL, {"assigned_only": 1})
 
         self.assertEqual(len(res.data), 1)  # type: ignore
+
+    def test_autocomplete_tags_by_prefix(self):
+        """Test autocomplete returns prefix matches before word matches"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Vegetarian")
+        Tag.objects.create(user=self.user, name="Quick vegan")
+        Tag.objects.create(user=self.user, name="Dessert")
+
+        res = self.client.get(TAG_AUTOCOMPLETE_URL, {"q": "veg"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag["name"] for tag in res.data], ["Vegan", "Vegetarian", "Quick vegan"]  # type: ignore
+        )
+
+    def test_autocomplete_database_and_cache_agree(self):
+        """Test the database and the in-memory index suggest the same names"""
+        self.addCleanup(autocomplete._indexes.clear)
+        for name in (
+            "Vegan", "vegetables", "Quick vegan", "A  veggie box", "Savegarde", "Big Vegan",
+        ):
+            Tag.objects.create(user=self.user, name=name)
+
+        for limit in (2, 4, 10):
+            res = self.client.get(TAG_AUTOCOMPLETE_URL, {"q": "veg", "limit": limit})
+            with self.settings(AUTOCOMPLETE_CACHE=True):
+                cached = self.client.get(TAG_AUTOCOMPLETE_URL, {"q": "veg", "limit": limit})
+
+            self.assertEqual(res.data, cached.data)  # type: ignore
+        self.assertEqual(
+            [tag["name"] for tag in res.data],  # type: ignore
+            ["Vegan", "vegetables", "A  veggie box", "Big Vegan", "Quick vegan"],
+        )
+
+    def test_autocomplete_tags_limited_to_user(self):
+        """Test autocomplete only suggests tags of the authenticated user"""
+        user2 = get_user_model().objects.create_user(email="test2@gmail.com", password="password")  # type: ignore
+        Tag.objects.create(user=user2, name="Vegan")
+        tag = Tag.objects.create(user=self.user, name="Vegetarian")
+
+        res = self.client.get(TAG_AUTOCOMPLETE_URL, {"q": "veg", "limit": 5})
+
+        self.assertEqual(res.data, [TagSerializer(tag).data])  # type: ignore
+
+    def test_autocomplete_cache_evicts_least_recently_used(self):
+        """Test only the most recently used indexes are kept per process"""
+        self.addCleanup(autocomplete._indexes.clear)
+        users = [self.user] + [
+            get_user_model().objects.create_user(  # type: ignore
+                **create_payload(email=f"user{index}@test.com")
+            )
+            for index in range(2)
+        ]
+
+        with self.settings(AUTOCOMPLETE_CACHE_SIZE=2):
+            for user in (users[0], users[1], users[0], users[2]):
+                autocomplete.get_index(Tag.objects.all(), user)
+
+        self.assertEqual(
+            list(autocomplete._indexes),
+            [("core.Tag", users[0].pk), ("core.Tag", users[2].pk)],
+        )
+
+    def test_autocomplete_tags_cached(self):
+        """Test the in-memory autocomplete index is refreshed on create"""
+        with self.settings(AUTOCOMPLETE_CACHE=True):
+            Tag.objects.create(user=self.user, name="Lunch")
+            res1 = self.client.get(TAG_AUTOCOMPLETE_URL, {"q": "lu"})
+            Tag.objects.create(user=self.user, name="Lunchbox")
+            res2 = self.client.get(TAG_AUTOCOMPLETE_URL, {"q": "lu", "limit": 1})
+            res3 = self.client.get(TAG_AUTOCOMPLETE_URL, {"q": "lu"})
+
+        self.assertEqual([tag["name"] for tag in res1.data], ["Lunch"])  # type: ignore
+        self.assertEqual([tag["name"] for tag in res2.data], ["Lunch"])  # type: ignore
+        self.assertEqual(
+            [tag["name"] for tag in res3.data], ["Lunch", "Lunchbox"]  # type: ignore
+        )
@@ -0,0 +1,102 @@
+"""Memory-bounded upload handling for recipe images.
+
+``ImageUploadHandler`` replaces Django's default upload handlers on
+``upload_image``. Uploads are kept in memory only up to
+``IMAGE_UPLOAD_SPOOL_SIZE`` bytes and spooled to disk beyond that. The
+format and dimensions are sniffed from the first bytes of the file without
+decoding pixel data, so oversized, unsupported or decompression-bomb
+images are rejected before the rest of the request body is read. The
+SHA-256 of the upload is computed on the fly for deduplication.
+"""
+import hashlib
+import io
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Upload handler validating image headers while the body streams in"""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.total_length = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.total_length = content_length
+
+    def reject(self, message):
+        """Stop reading the request body and remember why"""
+        self.error = message
+        raise StopUpload(connection_reset=True)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.total_length and self.total_length > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.reject(self.too_large_message())
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=settings.IMAGE_UPLOAD_SPOOL_SIZE, dir=settings.FILE_UPLOAD_TEMP_DIR
+        )
+        self.header = b""
+        self.image_info = None
+        self.digest = hashlib.sha256()
+
+    def too_large_message(self):
+        return "Image files may not be larger than {} bytes.".format(
+            settings.IMAGE_UPLOAD_MAX_BYTES
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.reject(self.too_large_message())
+        if self.image_info is None:
+            self.header += raw_data
+            self.sniff(final=len(self.header) >= settings.IMAGE_UPLOAD_SNIFF_BYTES)
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def sniff(self, final=False):
+        """Identify the image from the bytes received so far"""
+        from PIL import Image
+
+        try:
+            with Image.open(io.BytesIO(self.header)) as img:
+                info = (img.format, img.width, img.height)
+        except Exception:
+            if final:
+                self.reject("Upload a valid image.")
+            return
+        fmt, width, height = info
+        if fmt not in settings.IMAGE_UPLOAD_FORMATS:
+            self.reject(f"Images in {fmt} format are not supported.")
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.reject(
+                "Images may not have more than {} pixels.".format(
+                    settings.IMAGE_UPLOAD_MAX_PIXELS
+                )
+            )
+        self.image_info = info
+        self.header = b""
+
+    def file_complete(self, file_size):
+        if self.image_info is None:
+            try:
+                self.sniff(final=True)
+            except StopUpload:
+                self.file.close()
+                return None
+        self.file.seek(0)
+        upload = UploadedFile(
+            file=self.file,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+        upload.image_format, upload.image_width, upload.image_height = self.image_info
+        upload.sha256 = self.digest.hexdigest()
+        return upload
@@ -1,29 +1,51 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Sum
+from django.http import FileResponse, Http404, HttpResponse
+
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from rest_framework import viewsets, mixins, status
+from rest_framework.views import APIView
 
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 
-from core.models import Recipe, Tag, Ingredient
+from core import search
+from core.authentication import ExpiringTokenAuthentication
+from core.idempotency import IdempotentCreateMixin
+from recipe import autocomplete, images, similarity
+from recipe.uploads import ImageUploadHandler
+from core.models import Recipe, RecipeImageVariant, Tag, Ingredient
 from recipe.serializers import (  # type: ignore
     RecipeImageSerializer,
     RecipeSerializer,
     TagSerializer,
     IngredientSerializer,
     RecipeDetailSerializer,
+    RecipeCoverageSerializer,
+    RecipeSimilaritySerializer,
+    ShoppingListSerializer,
 )
 
 
 class BaseRcepieAttrViewSet(
-    viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin
+    IdempotentCreateMixin,
+    viewsets.GenericViewSet,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
 ):
     """Base viewset for user owned recipe attributes"""
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    read_from_replica = True
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
@@ -37,6 +59,23 @@ class BaseRcepieAttrViewSet(
         """Create a new object"""
         serializer.save(user=self.request.user)
 
+    @action(methods=["GET"], detail=False)
+    def autocomplete(self, request):
+        """Return the best name matches for the ?q= prefix"""
+        text = request.query_params.get("q", "").strip()
+        try:
+            limit = int(request.query_params.get("limit", self.autocomplete_limit))
+        except ValueError:
+            return Response(
+                {"limit": ["A valid integer is required."]}, status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, self.autocomplete_max_limit))
+        if not text:
+            return Response([])
+        results = autocomplete.suggest(self.queryset, request.user, text, limit)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
 
 class TagViewSet(BaseRcepieAttrViewSet):
     """Manage tags in the database"""
@@ -52,13 +91,16 @@ class IngredientViewSet(BaseRcepieAttrViewSet):
     serializer_class = IngredientSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     """Mange recipes in database"""
 
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthenticated,)
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
+    read_from_replica = True
+    # Set to "upload" for upload_image, see core.throttling.ScopedThrottle
+    throttle_scope = None
 
     def _params_to_ints(self, qs):
         """Conert a lis of strig IDs to a list of integers"""
@@ -68,13 +110,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Retrieve the tecipes for the authenticated users only"""
         tags = self.request.query_params.get("tags")  # type: ignore
         ingredients = self.request.query_params.get("ingredients")  # type: ignore
+        text = self.request.query_params.get("search")  # type: ignore
         queryset = self.queryset
         if tags:
             tags_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tags_ids)
+            queryset = queryset.filter(tags__id__in=tags_ids).distinct()
         if ingredients:
             ingredients_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredients_ids)
+            queryset = queryset.filter(ingredients__id__in=ingredients_ids).distinct()
+        if text:
+            queryset = search.search(queryset, text)
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.prefetch_related("ingredients", "tags", "image_variants")
 
         return queryset.filter(user=self.request.user)
 
@@ -84,6 +131,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeDetailSerializer
         elif self.action == "upload_image":
             return RecipeImageSerializer
+        elif self.action == "cookable":
+            return RecipeCoverageSerializer
+        elif self.action == "similar":
+            return RecipeSimilaritySerializer
+        elif self.action == "shopping_list":
+            return ShoppingListSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
@@ -91,13 +144,161 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         serializer.save(user=self.request.user)
 
-    @action(methods=["POST"], detail=True, url_path="upload-image")
+    @action(
+        methods=["GET", "POST"], detail=True, url_path="upload-image", throttle_scope="upload"
+    )
     def upload_image(self, request, pk=None):
-        """Upload an image to a recipe"""
+        """Upload an image to a recipe, or check its processing status"""
         recipe = self.get_object()
+        if request.method == "GET":
+            return Response(self.get_serializer(recipe).data)
+
+        handler = ImageUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
         serializer = self.get_serializer(recipe, data=request.data)
+        if handler.error:
+            return Response({"image": [handler.error]}, status.HTTP_400_BAD_REQUEST)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        try:
+            images.enqueue(recipe, serializer.validated_data["image"])
+        except images.QueueFull:
+            return Response(
+                {"detail": "Too many images are being processed, try again later."},
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "5"},
+            )
+        recipe.refresh_from_db()
+        return Response(self.get_serializer(recipe).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(methods=["GET"], detail=False)
+    def cookable(self, request):
+        """Return recipes that can be cooked from the ?ingredients= on hand
+
+        Recipes missing no ingredient come first, followed by recipes
+        missing at most ?missing= of them.
+        """
+        try:
+            ingredients_ids = self._params_to_ints(
+                request.query_params.get("ingredients", "")
+            )
+            missing = int(request.query_params.get("missing", 0))
+        except ValueError:
+            return Response(
+                {"detail": "ingredients and missing must be integers"},
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        through = Recipe.ingredients.through
+        candidates = through.objects.filter(
+            ingredient_id__in=ingredients_ids
+        ).values("recipe_id")
+        queryset = (
+            self.queryset.filter(user=request.user, id__in=candidates)
+            .annotate(
+                ingredients_count=Count("ingredients", distinct=True),
+                matched_count=Count(
+                    "ingredients",
+                    filter=Q(ingredients__id__in=ingredients_ids),
+                    distinct=True,
+                ),
+            )
+            .annotate(missing_count=F("ingredients_count") - F("matched_count"))
+            .filter(missing_count__lte=missing)
+            .order_by("missing_count", "-matched_count", "-id")
+            .prefetch_related("ingredients", "tags", "image_variants")
+        )
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(methods=["GET"], detail=True)
+    def similar(self, request, pk=None):
+        """Return the user's recipes sharing most ingredients and tags"""
+        recipe = self.get_object()
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 10)), 100))
+        except ValueError:
+            return Response(
+                {"limit": ["A valid integer is required."]}, status.HTTP_400_BAD_REQUEST
+            )
+        scores = dict(similarity.similar_recipes(recipe, limit))
+        recipes = self.queryset.filter(id__in=scores).prefetch_related(
+            "ingredients", "tags", "image_variants"
+        )
+        recipes = sorted(recipes, key=lambda obj: (-scores[obj.id], -obj.id))
+        for obj in recipes:
+            obj.similarity = scores[obj.id]
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(methods=["GET"], detail=False, url_path="shopping-list")
+    def shopping_list(self, request):
+        """Return the ingredients and totals of the ?recipes= chosen"""
+        try:
+            recipes_ids = self._params_to_ints(request.query_params.get("recipes", ""))
+        except ValueError:
+            return Response(
+                {"recipes": ["A comma separated list of ids is required."]},
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        recipes = self.queryset.filter(user=request.user, id__in=recipes_ids)
+        totals = recipes.aggregate(
+            recipes=Count("id"), time_minutes=Sum("time_minutes"), price=Sum("price")
+        )
+        ingredients = (
+            Recipe.ingredients.through.objects.filter(recipe__in=recipes)
+            .values("ingredient_id", "ingredient__name")
+            .annotate(count=Count("recipe_id"))
+            .order_by("ingredient__name", "ingredient_id")
+        )
+        serializer = self.get_serializer(
+            {
+                "recipes": totals["recipes"],
+                "time_minutes": totals["time_minutes"] or 0,
+                "price": totals["price"] or 0,
+                "ingredients": ingredients,
+            }
+        )
+        return Response(serializer.data)
+
+
+class RecipeMediaView(APIView):
+    """Serve recipe images to their owners only
+
+    Behind nginx the file is sent by an X-Accel-Redirect to the internal
+    MEDIA_ACCEL_REDIRECT_URL location, so bytes never pass through Django.
+    """
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    # A screen of thumbnails must not use up the API rate limits, the
+    # bytes themselves are served by nginx
+    throttle_classes = ()
+    immutable_name = re.compile(r"^upload/recipe/([0-9a-f]{2}/|[^/]+\.[0-9a-f]{16}\.)")
+
+    def get(self, request, name):
+        """Return the media file if it belongs to one of the user's recipes"""
+        name = os.path.normpath(name)
+        if name.startswith(("..", "/")):
+            raise Http404
+        owned = (
+            Recipe.objects.filter(user=request.user, image=name).exists()
+            or RecipeImageVariant.objects.filter(recipe__user=request.user, image=name).exists()
+        )
+        if not owned:
+            raise Http404
 
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        if settings.MEDIA_ACCEL_REDIRECT_URL:
+            response = HttpResponse(content_type="")
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_URL + name
+        else:
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if not os.path.exists(path):
+                raise Http404
+            response = FileResponse(
+                open(path, "rb"), content_type=mimetypes.guess_type(path)[0]
+            )
+        if self.immutable_name.match(name):
+            response["Cache-Control"] = "private, max-age=31536000, immutable"
+        return response
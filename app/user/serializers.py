@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth.base_user import BaseUserManager
 from django.utils.translation import ugettext_lazy as _
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
+
+from core.authentication import ExpiringTokenAuthentication
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -40,19 +43,42 @@ class AuthTokenSerializer(serializers.Serializer):
 
     email = serializers.CharField()
     password = serializers.CharField(
-        style={"input_type": "password"}, trim_whitespace=False
+        style={"input_type": "password"}, trim_whitespace=False, required=False
     )
+    device = serializers.CharField(max_length=100, required=False, default="")
+
+    def token_credentials(self, email):
+        """Return the user and token of a valid token sent for the same email
+
+        Lets clients holding a token log in again without paying for a
+        password hash.
+        """
+        request = self.context.get("request")
+        if request is None:
+            return None
+        try:
+            credentials = ExpiringTokenAuthentication().authenticate(request)
+        except exceptions.AuthenticationFailed:
+            return None
+        if credentials is None:
+            return None
+        if credentials[0].email != BaseUserManager.normalize_email(email):
+            return None
+        return credentials
 
     def validate(self, attrs):
         """Validate and authenticate user"""
         email = attrs.get("email")
         password = attrs.get("password")
 
-        user = authenticate(
-            request=self.context.get("request"), username=email, password=password
-        )
+        user, token = self.token_credentials(email) or (None, None)
+        if user is None and password:
+            user = authenticate(
+                request=self.context.get("request"), username=email, password=password
+            )
         if not user:
             msg = _("Unable to authenticate with provided credentials")
             raise serializers.ValidationError(msg, code="authentication")
         attrs["user"] = user
+        attrs["token"] = token
         return attrs
@@ -1,10 +1,15 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import AuthToken
+
 
 CREATE_USER_URL = reverse("user:create")
 TOKEN_URL = reverse("user:token")
@@ -24,6 +29,7 @@ class PublicUserApiTest(TestCase):
 
     def setUp(self):
         self.client = APIClient()
+        caches["shared"].clear()
 
     def test_create_valid_user_success(self):
         """Test creating user with valid payload is successful"""
@@ -99,6 +105,78 @@ class PublicUserApiTest(TestCase):
         self.assertNotIn("token", res.data)  # type: ignore
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_token_reuses_presented_token(self):
+        """Test a valid token is returned again without checking the password"""
+        create_user(**create_payload())
+        token = self.client.post(TOKEN_URL, create_payload()).data["token"]  # type: ignore
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        with patch("django.contrib.auth.hashers.PBKDF2PasswordHasher.encode") as encode:
+            res = self.client.post(TOKEN_URL, {"email": "test@test.com"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["token"], token)  # type: ignore
+        encode.assert_not_called()
+
+    def test_create_token_other_users_token(self):
+        """Test a token of another user does not log in"""
+        create_user(**create_payload())
+        other = create_user(email="other@test.com", password="otherpassword")
+        token = AuthToken.objects.issue(other)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        res = self.client.post(TOKEN_URL, {"email": "test@test.com"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_token_invalid_token_falls_back_to_password(self):
+        """Test an unknown token is ignored when the password is right"""
+        create_user(**create_payload())
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+        res = self.client.post(TOKEN_URL, create_payload())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_create_token_per_device(self):
+        """Test each device gets its own token and logging in again replaces it"""
+        user = create_user(**create_payload())
+
+        phone = self.client.post(TOKEN_URL, {**create_payload(), "device": "phone"})
+        laptop = self.client.post(TOKEN_URL, {**create_payload(), "device": "laptop"})
+        phone_again = self.client.post(TOKEN_URL, {**create_payload(), "device": "phone"})
+
+        self.assertIn("expires", phone.data)  # type: ignore
+        self.assertNotEqual(phone.data["token"], laptop.data["token"])  # type: ignore
+        self.assertEqual(
+            set(user.auth_tokens.values_list("key", flat=True)),
+            {laptop.data["token"], phone_again.data["token"]},  # type: ignore
+        )
+
+    @override_settings(AUTH_TOKEN_MAX_PER_USER=2)
+    def test_create_token_limits_tokens_per_user(self):
+        """Test the least recently used tokens are dropped beyond the limit"""
+        user = create_user(**create_payload())
+
+        for device in ("a", "b", "c"):
+            self.client.post(TOKEN_URL, {**create_payload(), "device": device})
+
+        self.assertEqual(
+            set(user.auth_tokens.values_list("device", flat=True)), {"b", "c"}
+        )
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_login_rehashes_password(self):
+        """Test logging in upgrades hashes made with another iteration count"""
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            user = create_user(**create_payload())
+
+        res = self.client.post(TOKEN_URL, create_payload())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertEqual(user.password.split("$")[1], "1000")
+
     def test_retreive_user_unatuthorized(self):
         """Test that authentication is required for users"""
 
@@ -1,12 +1,17 @@
 from django.contrib.auth import get_user_model
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core import deletion
+from core.authentication import ExpiringTokenAuthentication
+from core.idempotency import IdempotentCreateMixin
+from core.models import AuthToken
 from user.serializers import AuthTokenSerializer, UserSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(IdempotentCreateMixin, generics.CreateAPIView):
     """Create a new user in the system"""
 
     model = get_user_model()
@@ -18,15 +23,36 @@ class CreateTokenView(ObtainAuthToken):
 
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = "login"
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        token = serializer.validated_data["token"]
+        if token is None:
+            token = AuthToken.objects.issue(
+                serializer.validated_data["user"], serializer.validated_data["device"]
+            )
+        return Response({"token": token.key, "expires": token.expires})
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """Manage existing user"""
 
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    read_from_replica = True
 
     def get_object(self):
         """Retreive and return authentication user"""
         return self.request.user
+
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate the account now and delete its data in the background"""
+        deletion.request_deletion(self.get_object())
+        return Response(
+            {"detail": "Your account has been scheduled for deletion."},
+            status=status.HTTP_202_ACCEPTED,
+        )
@@ -0,0 +1,5 @@
+#!/bin/sh
+# Allow streaming replication connections to the primary, used by the
+# db-replica service of docker-compose.replica.yml. Only runs when the data
+# volume is initialised.
+echo "host replication all all md5" >> "$PGDATA/pg_hba.conf"